@@ -0,0 +1,368 @@
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+
+import matplotlib
+import numpy as np
+
+import stats
+
+# Banc d'essai : génère des exports synthétiques au format de l'export réel
+# (33 colonnes séparées par ";") puis mesure la durée et le pic de mémoire de
+# chaque get_*, de chaque create_graph_*, de generate_pdf_report et du rapport
+# complet. Les résultats sont ajoutés à BENCH_RESULTATS pour comparer les
+# exécutions dans le temps.
+#
+#   python bench.py                  -> 10 000, 100 000 et 1 000 000 lignes
+#   python bench.py 10000 50000      -> tailles choisies
+#   python bench.py --service        -> vérifie que le service répond sous le
+#                                       nom de chaque get_* (voir verifier_service)
+
+BENCH_DIR = "bench"
+BENCH_RESULTATS = f"{BENCH_DIR}/resultats.json"
+TAILLES = [10_000, 100_000, 1_000_000]
+
+EN_TETE = ["Date", "Jour de la semaine", "Jour / Nuit", "FIP", "FOLIO", "Horaire", "Priorité", "Leader",
+           "Equipier.iére", "Troisiéme", "Ambulance", "Intervenants", "Médicalisation", "Alarme", "Départ",
+           "Sur site", "Québec", "Hôpital", "Libre", "Lieu de PEC", "Commune de PEC", "Destination de PEC",
+           "Type 17", "Code FIP", "Motif EST", "Degré EST", "NACA", "Médecin ?", "Trauma / Médical",
+           "Protocoles", "Sexe", "Date de naissance", "Age"]
+
+PRENOMS = ["Jean", "Marie", "Luc", "Anne", "Paul", "Sophie", "Marc", "Julie", "Pierre", "Claire",
+           "Nicolas", "Emma", "Thomas", "Léa", "David", "Sarah", "Yves", "Chloé", "Loïc", "Inès"]
+NOMS = ["Dupont", "Martin", "Bernard", "Favre", "Rochat", "Muller", "Rey", "Blanc", "Pache", "Girard"]
+JOURS = ["lundi", "mardi", "mercredi", "jeudi", "vendredi", "samedi", "dimanche"]
+MOTIFS = ["1101 - Douleur thoracique", "1105 - AVC", "1201 - Chute", "1301 - Malaise",
+          "1401 - Dyspnée", "1501 - Trauma", "1601 - Intoxication", "1701 - Psychiatrie"]
+COMMUNES = ["Lausanne", "Morges", "Renens", "Prilly", "Pully", "Ecublens"]
+DESTINATIONS = ["CHUV", "Hôpital de Morges", "Clinique de la Source", ""]
+
+
+def heure(minutes):
+    # minutes depuis le début de la journée -> "HH:MM", après minuit on repart à 00:00
+    minutes %= 24 * 60
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def generer_export(chemin, nb_lignes, graine=0, annee=2025, mois=12):
+    """Écrit un export synthétique de nb_lignes interventions.
+
+    Les heures suivent la chaîne alarme -> départ -> sur site -> québec ->
+    hôpital -> libre et passent minuit quand l'alarme est tardive, environ
+    une intervention sur cinq n'a pas d'heure d'hôpital (pas de transport),
+    et quelques noms contiennent un double espace comme dans l'export réel.
+    """
+    alea = random.Random(graine)
+    personnes = [f"{prenom} {nom}" for prenom in PRENOMS for nom in NOMS[:3]]
+    premier_jour = date(annee, mois, 1)
+    nb_jours = ((premier_jour + timedelta(days=32)).replace(day=1) - premier_jour).days
+
+    os.makedirs(os.path.dirname(chemin) or ".", exist_ok=True)
+    with open(chemin, "w", newline="", encoding="utf-8") as fichier:
+        ecrivain = csv.writer(fichier, delimiter=";")
+        ecrivain.writerow(EN_TETE)
+        for numero in range(nb_lignes):
+            jour = premier_jour + timedelta(days=alea.randrange(nb_jours))
+            alarme = alea.randrange(24 * 60)
+            depart = alarme + alea.randint(0, 4)
+            sur_site = depart + alea.randint(4, 25)
+            quebec = sur_site + alea.randint(8, 70)
+            hopital = quebec + alea.randint(5, 40)
+            libre = hopital + alea.randint(10, 45)
+            transport = alea.random() < 0.8
+
+            leader, equipier = alea.sample(personnes, 2)
+            if alea.random() < 0.03:
+                leader = leader.replace(" ", "  ")
+            if alea.random() < 0.03:
+                equipier = equipier.replace(" ", "  ")
+            troisieme = alea.choice(personnes) if alea.random() < 0.1 else ""
+
+            motif = alea.choice(MOTIFS)
+            age = alea.choices([alea.randint(0, 15), alea.randint(16, 64), alea.randint(65, 100)],
+                               weights=[1, 5, 4])[0]
+            date_naissance = f"01.01.{annee - age}" if alea.random() < 0.95 else ""
+
+            ecrivain.writerow([
+                jour.strftime("%d.%m.%Y"),
+                JOURS[jour.weekday()],
+                "Jour" if 7 * 60 <= alarme < 19 * 60 else "Nuit",
+                f"{annee}{numero:08d}",
+                str(numero),
+                "",
+                alea.choices(stats.PRIORITES, weights=[3, 4, 5, 1, 1])[0],
+                leader,
+                equipier,
+                troisieme,
+                "60" + alea.choice(stats.AMBULANCES),
+                "",
+                "Oui" if alea.random() < 0.15 else "",
+                heure(alarme),
+                heure(depart),
+                heure(sur_site),
+                heure(quebec),
+                heure(hopital) if transport else "",
+                heure(libre),
+                "Domicile",
+                alea.choice(COMMUNES),
+                alea.choice(DESTINATIONS) if transport else "",
+                "",
+                f"{alea.randint(1, 99):02d}",
+                motif,
+                alea.choice(["1", "1", "2", "3"]),
+                alea.choices(stats.NACAS, weights=[3, 10, 20, 25, 15, 6, 2, 1, 4])[0],
+                "Oui" if alea.random() < 0.1 else "Non",
+                "Trauma" if motif.startswith("1501") else "Médical",
+                "",
+                alea.choice("MF"),
+                date_naissance,
+                str(age) if alea.random() < 0.97 else "",
+            ])
+
+
+def chemin_export(nb_lignes):
+    # le nom contient un mois et une année, comme un vrai export
+    return os.path.abspath(f"{BENCH_DIR}/donnees/{nb_lignes} lignes/decembre 2025.csv")
+
+
+def pic_memoire_mo():
+    # pic de mémoire résidente du processus, None si le système ne le donne pas
+    try:
+        # sous Linux, ru_maxrss garde le pic du processus parent d'avant
+        # l'exec ; VmHWM ne compte que celui-ci
+        with open("/proc/self/status", encoding="ascii") as statut:
+            for ligne in statut:
+                if ligne.startswith("VmHWM:"):
+                    return int(ligne.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return pic_memoire_windows_mo()
+    pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ko sous Linux, octets sous macOS
+    return pic / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def pic_memoire_windows_mo():
+    try:
+        import ctypes
+        from ctypes import wintypes
+    except ImportError:
+        return None
+
+    class Compteurs(ctypes.Structure):
+        _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+    compteurs = Compteurs()
+    compteurs.cb = ctypes.sizeof(Compteurs)
+    processus = ctypes.windll.kernel32.GetCurrentProcess()
+    if not ctypes.windll.psapi.GetProcessMemoryInfo(processus, ctypes.byref(compteurs), compteurs.cb):
+        return None
+    return compteurs.PeakWorkingSetSize / (1024 * 1024)
+
+
+# ====== ÉTAPES MESURÉES =====
+# Chaque étape tourne dans un processus neuf, lancé dans un dossier
+# temporaire vide : les caches de stats.py (tables, graphiques, résumés)
+# y sont créés vides et le pic de mémoire ne dépend que de l'étape.
+
+def etape_get(nom, chemin):
+    with open(chemin, newline="", encoding="utf-8") as csvfile:
+        getattr(stats, nom)(csv.reader(csvfile, delimiter=";"))
+
+
+def etape_graphique(nom, resultat):
+    stats.GRAPHIQUES[nom](resultat, f"{nom}.png")
+
+
+def etape_pdf(arguments, graphiques):
+    stats.generate_pdf_report(**arguments, output_path="rapport.pdf", graphiques=graphiques)
+
+
+def etape_rapport(chemin):
+    stats.generer_rapport(chemin, "rapport.pdf", "graphiques", *stats.mois_annee_depuis_nom(chemin))
+
+
+def executer_etape(etape, *arguments):
+    dossier = tempfile.mkdtemp(prefix="bench_")
+    dossier_initial = os.getcwd()
+    os.chdir(dossier)
+    try:
+        avant = pic_memoire_mo()
+        debut = time.perf_counter()
+        etape(*arguments)
+        duree = time.perf_counter() - debut
+        return {"secondes": duree, "rss_avant_mo": avant, "rss_max_mo": pic_memoire_mo()}
+    finally:
+        os.chdir(dossier_initial)
+        shutil.rmtree(dossier, ignore_errors=True)
+
+
+def mesurer(etape, *arguments):
+    contexte = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=contexte) as executeur:
+        return executeur.submit(executer_etape, etape, *arguments).result()
+
+
+def arguments_pdf(resultats):
+    # mêmes arguments que ceux donnés par rapport_depuis_resume
+    classements = stats.classements_par_personne(resultats["par_personne"])
+    return {
+        "nombre_interventions": resultats["nb_interventions"],
+        "temps_moyen_sur_site": resultats["temps_sur_site"]["moyenne"],
+        "age_moyen": stats.resume_ages(resultats["ages"])["moyenne"],
+        "motifs_EST": resultats["motifs_EST"],
+        "nacas_bas": classements["nacas_bas"],
+        "nacas_hauts": classements["nacas_hauts"],
+        "nacas_p3": resultats["nacas_p3"],
+        "inter_nuit": classements["inter_nuit"],
+        "nb_inter_by_personne": classements["nb_inter_by_personne"],
+        "nb_inter_by_binome": stats.classements_binomes(resultats["binomes"])["nb_inter_by_binome"],
+        "fastest_avc": resultats["fastest_avc"],
+        "age_moyen_by_ambu": classements["age_moyen_by_ambu"],
+        "nb_inter_ped": classements["nb_inter_ped"],
+        "nb_depart_a_midi_by_personne": classements["nb_depart_a_midi_by_personne"],
+        "quantiles_durees": resultats["quantiles_durees"],
+        "occupation": resultats["occupation"],
+        "mois": "décembre",
+        "annee": "2025",
+    }
+
+
+def mesurer_taille(nb_lignes):
+    chemin = chemin_export(nb_lignes)
+    if not os.path.exists(chemin):
+        print(f"Génération de l'export synthétique ({nb_lignes} lignes)...")
+        generer_export(chemin, nb_lignes)
+
+    mesures = []
+
+    def noter(etape, mesure):
+        mesure.update({"lignes": nb_lignes, "etape": etape,
+                       "lignes_par_seconde": nb_lignes / mesure["secondes"] if mesure["secondes"] else None})
+        mesures.append(mesure)
+        print(f"{nb_lignes:>9} lignes  {etape:<42} {mesure['secondes']:8.3f} s"
+              + (f"  {mesure['rss_max_mo']:8.1f} Mo" if mesure["rss_max_mo"] is not None else ""))
+
+    for nom in sorted(nom for nom in dir(stats) if nom.startswith("get_")):
+        noter(nom, mesurer(etape_get, nom, chemin))
+
+    resultats = stats.calculer_table(stats.charger_table_fichier(chemin, cache=False), stats.creer_agregateurs())
+    for nom, dessiner in stats.GRAPHIQUES.items():
+        noter(dessiner.__name__, mesurer(etape_graphique, nom, resultats[nom]))
+
+    # le PDF a besoin des graphiques : ils sont dessinés une fois avant la mesure
+    dossier_graphiques = os.path.abspath(f"{BENCH_DIR}/graphiques")
+    os.makedirs(dossier_graphiques, exist_ok=True)
+    graphiques = stats.chemins_graphiques(dossier_graphiques)
+    for nom, dessiner in stats.GRAPHIQUES.items():
+        dessiner(resultats[nom], graphiques[nom])
+    noter("generate_pdf_report", mesurer(etape_pdf, arguments_pdf(resultats), graphiques))
+
+    noter("rapport complet (main)", mesurer(etape_rapport, chemin))
+    return mesures
+
+
+def verifier_service(nb_lignes=TAILLES[0]):
+    """Interroge le service sous le nom de chaque get_* / repartition_* public.
+
+    Le service est lancé sur un port libre, sur l'export synthétique de
+    nb_lignes lignes ; chaque nom doit répondre 200 (voir
+    stats.CLES_FONCTIONS), sinon une AssertionError donne ceux qui manquent.
+    """
+    import threading
+    import urllib.error
+    import urllib.request
+    from urllib.parse import quote
+
+    chemin = chemin_export(nb_lignes)
+    if not os.path.exists(chemin):
+        print(f"Génération de l'export synthétique ({nb_lignes} lignes)...")
+        generer_export(chemin, nb_lignes)
+    export = quote(os.path.splitext(os.path.basename(chemin))[0])
+    noms = sorted(nom for nom in dir(stats)
+                  if nom.startswith(("get_", "repartition_")) and callable(getattr(stats, nom)))
+
+    # comme executer_etape : les caches de stats.py vont dans un dossier temporaire
+    dossier = tempfile.mkdtemp(prefix="bench_")
+    dossier_initial = os.getcwd()
+    os.chdir(dossier)
+    serveur = stats.creer_serveur(port=0, dossier_donnees=os.path.dirname(chemin))
+    threading.Thread(target=serveur.serve_forever, daemon=True).start()
+    sans_reponse = []
+    try:
+        for nom in noms:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{serveur.server_port}/stats/{export}/{nom}") as reponse:
+                    code = reponse.status
+            except urllib.error.HTTPError as erreur:
+                code = erreur.code
+            if code != 200:
+                sans_reponse.append(f"{nom} ({code})")
+    finally:
+        serveur.shutdown()
+        serveur.server_close()
+        os.chdir(dossier_initial)
+        shutil.rmtree(dossier, ignore_errors=True)
+    assert not sans_reponse, f"Sans réponse du service : {', '.join(sans_reponse)}"
+    print(f"Service : les {len(noms)} fonctions get_* / repartition_* répondent.")
+
+
+def version_du_code():
+    # commit courant, pour savoir quel code a donné quels résultats
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def enregistrer_resultats(mesures, chemin=BENCH_RESULTATS):
+    # chaque exécution est ajoutée à la liste des précédentes
+    try:
+        with open(chemin, encoding="utf-8") as fichier:
+            executions = json.load(fichier)
+    except FileNotFoundError:
+        executions = []
+    executions.append({
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "commit": version_du_code(),
+        "machine": {"systeme": platform.platform(), "processeurs": os.cpu_count(),
+                    "python": platform.python_version(), "numpy": np.__version__,
+                    "matplotlib": matplotlib.__version__},
+        "mesures": mesures,
+    })
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    with open(chemin, "w", encoding="utf-8") as fichier:
+        json.dump(executions, fichier, ensure_ascii=False, indent=2)
+
+
+def main(tailles=TAILLES):
+    mesures = []
+    for nb_lignes in tailles:
+        mesures += mesurer_taille(nb_lignes)
+    enregistrer_resultats(mesures)
+    print(f"Résultats ajoutés à {BENCH_RESULTATS}")
+
+
+if __name__ == "__main__":
+    if "--service" in sys.argv[1:]:
+        verifier_service()
+    else:
+        main([int(taille) for taille in sys.argv[1:]] or TAILLES)
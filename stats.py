@@ -1,21 +1,34 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict, defaultdict
+import copy
 import csv
 from datetime import datetime
+import hashlib
+import heapq
+import io
+import json
+from functools import lru_cache, partial
+from itertools import islice, repeat, zip_longest
+import mmap
+import os
+import pickle
 import re
-import matplotlib.pyplot as plt
-from reportlab.platypus import SimpleDocTemplate, Image, Spacer, Paragraph, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import inch
-from reportlab.lib.styles import ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import cm
+import shutil
+import sys
+import time
+import tracemalloc
+import unicodedata
 import numpy as np
+# matplotlib, reportlab et concurrent.futures ne sont importés que dans les
+# fonctions qui dessinent les graphiques et le PDF ou lancent des processus,
+# sqlite3 que dans ouvrir_base (--base), le serveur HTTP que dans servir
+# (--service) : le calcul seul (--json) ne les charge jamais
 
 OUTPUT_DIR = "output"
-CSV_DATA_FILE = "janvier 2026.csv"
 CSV_DATA_FILE = "decembre 2025.csv"
 DATA_DIR = "data"
 OUTPUT_PATH = f"{OUTPUT_DIR}/rapport_qualite - {CSV_DATA_FILE.replace('.csv', '.pdf')}"
+JSON_PATH = f"{OUTPUT_DIR}/statistiques - {CSV_DATA_FILE.replace('.csv', '.json')}"
 DATA_PATH = f"{DATA_DIR}/{CSV_DATA_FILE}"
 
 GRAPH_PRIORITES_PATH = f"{OUTPUT_DIR}/graph_priorites.png"
@@ -23,11 +36,49 @@ GRAPH_AMBULANCES_PATH = f"{OUTPUT_DIR}/graph_ambulances.png"
 GRAPH_NACAS_PATH = f"{OUTPUT_DIR}/graph_nacas.png"
 GRAPH_AGES_PATH = f"{OUTPUT_DIR}/graph_ages.png"
 GRAPH_INTER_BY_HEURE_PATH = f"{OUTPUT_DIR}/graph_inter_by_heure.png"
+GRAPH_OCCUPATION_PATH = f"{OUTPUT_DIR}/graph_occupation.png"
 
+TAILLE_CLASSEMENTS = 3  # nombre de personnes (ou binômes) gardées dans chaque classement, hors égalités
 LIMITE_MIN_INTER = 5  # pour les statistiques par personne, on ne prend que les personnes ayant au moins 5 interventions pour éviter les biais liés à un petit nombre d'interventions
 
-MOIS = "décembre"
-ANNEE = "2025"
+NOMS_MOIS = ["janvier", "février", "mars", "avril", "mai", "juin", "juillet",
+             "août", "septembre", "octobre", "novembre", "décembre"]
+
+
+def sans_accents(texte):
+    return "".join(c for c in unicodedata.normalize("NFKD", texte) if not unicodedata.combining(c))
+
+
+def mois_annee_depuis_nom(nom_fichier):
+    # "data/decembre 2025.csv" -> ("décembre", "2025"), None si le nom ne contient pas de mois suivi d'une année
+    nom = os.path.splitext(os.path.basename(nom_fichier))[0]
+    correspondance = re.fullmatch(r"\s*([^\W\d_]+)[\s_-]+(\d{4})\s*", nom)
+    if correspondance is None:
+        return None
+    for mois in NOMS_MOIS:
+        if sans_accents(mois) == sans_accents(correspondance.group(1).lower()):
+            return mois, correspondance.group(2)
+    return None
+
+
+def chemins_graphiques(dossier):
+    return {
+        "priorites": f"{dossier}/graph_priorites.png",
+        "ambulances": f"{dossier}/graph_ambulances.png",
+        "nacas": f"{dossier}/graph_nacas.png",
+        "ages": f"{dossier}/graph_ages.png",
+        "inter_by_heure": f"{dossier}/graph_inter_by_heure.png",
+        "occupation": f"{dossier}/graph_occupation.png",
+    }
+
+
+# si le nom de CSV_DATA_FILE ne contient pas de mois suivi d'une année, le
+# rapport porte le nom du fichier (et aucun résumé mensuel n'est enregistré)
+MOIS, ANNEE = mois_annee_depuis_nom(CSV_DATA_FILE) or (os.path.splitext(CSV_DATA_FILE)[0], "")
+
+
+def minutes_vers_hhmm(minutes):
+    return f"{minutes // 60}h{minutes % 60:02d}"
 
 
 def decimal_vers_hhmm(heures):
@@ -74,684 +125,2471 @@ def decimal_vers_hhmm(heures):
 # 31 - Date de naissance
 # 32 - Age
 
-def get_temps_sur_site(lecteur):
-    total_temps = 0
-    nombre_lignes = 0
-
-    next(lecteur, None)  # saute l'en-tête
-
-    for ligne in lecteur:
-        # si la colonne Hopital (index 17) est vide, on ignore la ligne
-        if not ligne[17].strip():
-            continue
-
-        # extraire l'heure depuis la colonne "Sur site" (index 15)
-        sur_site_raw = ligne[15].strip()
-        tmp = datetime.strptime(sur_site_raw, "%H:%M")
-        sur_site_hour = tmp.hour + tmp.minute / 60
-
-        # extraire l'heure depuis la colonne "Quebec" (index 16)
-        quebec_raw = ligne[16].strip()
-        tmp = datetime.strptime(quebec_raw, "%H:%M")
-        quebec_hour = tmp.hour + tmp.minute / 60
+# ====== INSTRUMENTATION =====
+# Mesure des étapes du rapport (lecture, calcul, graphiques, PDF...) : durée,
+# temps CPU du processus, lignes traitées et pic de mémoire allouée (suivie
+# avec tracemalloc). Désactivée par défaut : une étape ne fait alors qu'un
+# test sur `trace`. Les graphiques dessinés dans d'autres processus ne sont
+# comptés que dans la durée.
+TRACE_PATH = f"{OUTPUT_DIR}/trace.json"
+trace = None  # étapes mesurées depuis activer_trace(), None si désactivée
+debut_trace = 0.0
+
+
+def activer_trace():
+    global trace, debut_trace
+    trace = []
+    debut_trace = time.perf_counter()
+    tracemalloc.start()
+
+
+class Etape:
+    """Mesure le bloc `with Etape("lecture") as etape:` si la trace est activée.
+
+    Les lignes traitées peuvent être données au début (`lignes=`) ou une
+    fois connues (`etape.lignes = ...`). Les étapes peuvent s'imbriquer :
+    le pic de mémoire d'une étape compte celui des étapes qu'elle contient.
+    """
+    en_cours = []
+
+    def __init__(self, nom, lignes=None):
+        self.nom = nom
+        self.lignes = lignes
+
+    def __enter__(self):
+        self.mesure = None
+        if trace is None:
+            return self
+        memoire, pic = tracemalloc.get_traced_memory()
+        if Etape.en_cours:
+            parent = Etape.en_cours[-1]
+            parent.pic = max(parent.pic, pic)
+        tracemalloc.reset_peak()
+        self.memoire_debut = self.pic = memoire
+        self.mesure = {"etape": self.nom, "niveau": len(Etape.en_cours),
+                       "debut_s": time.perf_counter() - debut_trace}
+        trace.append(self.mesure)
+        Etape.en_cours.append(self)
+        self.debut = time.perf_counter()
+        self.cpu_debut = time.process_time()
+        return self
+
+    def __exit__(self, *erreur):
+        if self.mesure is None:
+            return False
+        duree = time.perf_counter() - self.debut
+        cpu = time.process_time() - self.cpu_debut
+        self.pic = max(self.pic, tracemalloc.get_traced_memory()[1])
+        Etape.en_cours.pop()
+        if Etape.en_cours:
+            parent = Etape.en_cours[-1]
+            parent.pic = max(parent.pic, self.pic)
+        self.mesure.update({
+            "duree_s": duree,
+            "cpu_s": cpu,
+            "lignes": self.lignes,
+            "lignes_par_s": self.lignes / duree if self.lignes and duree > 0 else None,
+            "pic_memoire_mo": (self.pic - self.memoire_debut) / (1024 * 1024),
+        })
+        return False
+
+
+def ecrire_trace(chemin=TRACE_PATH):
+    os.makedirs(os.path.dirname(chemin) or ".", exist_ok=True)
+    with open(chemin, "w", encoding="utf-8") as fichier:
+        json.dump(trace, fichier, ensure_ascii=False, indent=2)
+    print(f"Trace écrite : {chemin}")
+
+
+def afficher_trace():
+    print(f"{'Étape':<34}{'Durée (s)':>11}{'CPU (s)':>10}{'Lignes':>10}{'Lignes/s':>12}{'Mémoire (Mo)':>14}")
+    for mesure in trace:
+        lignes = f"{mesure['lignes']:>10}" if mesure["lignes"] is not None else " " * 10
+        debit = f"{mesure['lignes_par_s']:>12.0f}" if mesure["lignes_par_s"] else " " * 12
+        print(f"{'  ' * mesure['niveau'] + mesure['etape']:<34}{mesure['duree_s']:>11.3f}{mesure['cpu_s']:>10.3f}"
+              f"{lignes}{debit}{mesure['pic_memoire_mo']:>14.1f}")
+
+
+# ====== MOTEUR DE CALCUL =====
+# Le fichier n'est lu qu'une seule fois et converti en une table de colonnes
+# typées (heures en minutes, âges en entiers, catégories en petits codes).
+# Chaque statistique est un agrégateur qui reçoit cette table et la traite
+# avec des opérations NumPy vectorisées (masques, bincount, argmax...).
+
+PRIORITES = ["P1", "P2", "P3", "S1 feux bleus", "S1 sans feux bleus"]
+AMBULANCES = ["704", "705", "706", "707", "708", "709"]
+NACAS = ["0", "1", "2", "3", "4", "5", "6", "7", "9"]
+
+# colonne de l'export -> nom de la colonne dans la table
+COLONNES_HEURES = {13: "alarme", 14: "depart", 15: "sur_site",
+                   16: "quebec", 17: "hopital", 18: "libre"}
+COLONNES_TEXTE = {0: "date", 3: "fip"}
+# les trois membres de l'équipage partagent le même registre de noms
+COLONNES_PERSONNES = {7: "leader", 8: "equipier", 9: "troisieme"}
+
+
+class TableInterventions:
+    """Colonnes typées d'un export, une valeur par intervention.
+
+    Les heures sont en minutes depuis minuit et les âges en entiers (-1 si
+    vide ou invalide, voir `heures_en_minutes`). Les colonnes catégorielles
+    (priorité, ambulance, NACA, motif et degré EST, jour / nuit, commune de
+    PEC) sont des codes entiers, -1 si vide, dont les libellés sont dans
+    `categories`. Leader, équipier et
+    troisième sont des identifiants de personne, communs aux trois colonnes,
+    dont les noms normalisés sont dans `categories["personne"]`.
+    """
+
+    def __init__(self, colonnes, categories, heures_invalides=None):
+        self.colonnes = colonnes
+        self.categories = categories
+        # colonne d'heures -> nombre de cellules remplies mais illisibles
+        self.heures_invalides = heures_invalides or {}
+        self._horodatages = None
+
+    def __len__(self):
+        return len(self.colonnes["age"])
+
+    def __getitem__(self, nom):
+        return self.colonnes[nom]
+
+    def codes(self, colonne, condition):
+        # codes des libellés de la colonne qui vérifient la condition
+        return [code for code, libelle in enumerate(self.categories[colonne]) if condition(libelle)]
+
+    def personne(self, identifiant):
+        # nom normalisé d'un identifiant de personne, "" si la cellule était vide
+        return self.categories["personne"][identifiant] if identifiant >= 0 else ""
+
+    def horodatages(self):
+        # instants de chaque phase (voir horodatages_phases), calculés une fois par table
+        if self._horodatages is None:
+            self._horodatages = horodatages_phases(self)
+        return self._horodatages
+
+    def filtrer(self, masque):
+        # table des seules lignes du masque booléen, sans relire l'export ; les
+        # catégories (et donc les codes) sont partagées avec la table complète
+        table = TableInterventions({nom: valeurs[masque] for nom, valeurs in self.colonnes.items()},
+                                   self.categories)
+        if self._horodatages is not None:
+            table._horodatages = {phase: instants[masque] for phase, instants in self._horodatages.items()}
+        return table
+
+
+def grouper(valeurs):
+    """Regroupe les valeurs identiques dans l'ordre de première apparition.
+
+    Retourne (uniques, indices) tels que valeurs == uniques[indices].
+    """
+    uniques, premiers, indices = np.unique(
+        valeurs, return_index=True, return_inverse=True)
+    ordre = np.argsort(premiers)
+    rang = np.empty_like(ordre)
+    rang[ordre] = np.arange(len(ordre))
+    return uniques[ordre], rang[indices.reshape(-1)]
+
+
+def heures_en_minutes(valeurs):
+    """Convertit une colonne d'heures "HH:MM" (ou "H:MM") en minutes depuis minuit.
+
+    Toute la colonne est traitée d'un coup en lisant les caractères comme
+    des entiers. Retourne (minutes, valide) : une cellule vide ou mal
+    formée ne lève pas d'erreur, elle vaut -1 et n'est pas valide.
+    """
+    textes = np.char.strip(np.asarray(valeurs, dtype=str))
+    if textes.size == 0:
+        return np.zeros(0, dtype=np.int16), np.zeros(0, dtype=bool)
+    longueurs = np.char.str_len(textes)
+    # "7:05" -> "07:05", puis chaque caractère devient un entier (code point)
+    caracteres = np.char.rjust(textes, 5, "0").astype("U5").view(
+        np.uint32).reshape(-1, 5).astype(np.int32)
+    chiffres = caracteres - ord("0")
+
+    valide = (longueurs >= 4) & (longueurs <= 5) & (caracteres[:, 2] == ord(":"))
+    valide &= np.all((chiffres[:, [0, 1, 3, 4]] >= 0) &
+                     (chiffres[:, [0, 1, 3, 4]] <= 9), axis=1)
+    heures = chiffres[:, 0] * 10 + chiffres[:, 1]
+    minutes = chiffres[:, 3] * 10 + chiffres[:, 4]
+    valide &= (heures < 24) & (minutes < 60)
+
+    return np.where(valide, heures * 60 + minutes, -1).astype(np.int16), valide
+
+
+# phases d'une mission, dans l'ordre : chaque heure suit la précédente
+PHASES = list(COLONNES_HEURES.values())
+# durées d'une phase à la suivante : nom -> (heure de début, heure de fin)
+DUREES_PHASES = {"activation": ("alarme", "depart"),
+                 "trajet": ("depart", "sur_site"),
+                 "sur_site": ("sur_site", "quebec"),
+                 "transport": ("quebec", "hopital"),
+                 "remise_en_service": ("hopital", "libre")}
+
+
+def jours_depuis_dates(dates):
+    # numéro du jour (date.toordinal) de chaque date "jj.mm.aaaa", -1 si illisible ;
+    # chaque date distincte n'est lue qu'une fois
+    uniques, indices = grouper(np.char.strip(dates))
+    jours = []
+    for texte in uniques.tolist():
+        try:
+            jours.append(datetime.strptime(texte, "%d.%m.%Y").toordinal())
+        except ValueError:
+            jours.append(-1)
+    return np.array(jours, dtype=np.int64)[indices]
+
+
+def horodatages_phases(table):
+    """Instant de chaque phase, en minutes depuis le 1er janvier de l'an 1.
+
+    La première heure renseignée de la ligne est placée au jour de la
+    colonne Date (au jour 0 si la date est illisible : seules les durées ont
+    alors un sens). Chaque heure suivante est placée au premier instant qui
+    ne précède pas la phase renseignée d'avant : les passages de minuit sont
+    résolus phase par phase, une mission peut donc durer plus de 24h ou
+    changer de mois. Retourne {phase: instants}, -1 si l'heure est vide.
+    """
+    debut_jour = np.maximum(jours_depuis_dates(table["date"]), 0) * 24 * 60
+    horodatages = {}
+    heure_precedente = np.full(len(table), -1, dtype=np.int64)
+    instant_precedent = np.full(len(table), -1, dtype=np.int64)
+    for phase in PHASES:
+        heures = table[phase].astype(np.int64)
+        valide = heures >= 0
+        instants = np.where(heure_precedente >= 0,
+                            instant_precedent + (heures - heure_precedente) % (24 * 60),
+                            debut_jour + heures)
+        horodatages[phase] = np.where(valide, instants, -1)
+        heure_precedente = np.where(valide, heures, heure_precedente)
+        instant_precedent = np.where(valide, instants, instant_precedent)
+    return horodatages
+
+
+def durees_entre(table, debut, fin):
+    """Durée en minutes entre deux phases de la table (voir horodatages_phases).
+
+    Retourne (durees, valide), valide étant faux si l'une des deux heures
+    est vide ou invalide.
+    """
+    horodatages = table.horodatages()
+    valide = (horodatages[debut] >= 0) & (horodatages[fin] >= 0)
+    return np.where(valide, horodatages[fin] - horodatages[debut], -1), valide
+
+
+def durees_phases(table):
+    # {nom de DUREES_PHASES: (durees, valide)}
+    return {nom: durees_entre(table, debut, fin) for nom, (debut, fin) in DUREES_PHASES.items()}
+
+
+def encoder_categories(valeurs, libelles_initiaux=()):
+    # chaque libellé reçoit un code, les libellés initiaux d'abord puis les
+    # autres dans l'ordre de première apparition ; une cellule vide vaut -1
+    uniques, indices = grouper(np.array(valeurs, dtype=str))
+    libelles = list(libelles_initiaux)
+    libelles += [u for u in uniques.tolist()
+                 if u and u not in libelles_initiaux]
+    index = {libelle: code for code, libelle in enumerate(libelles)}
+    codes_uniques = np.array([index.get(u, -1)
+                             for u in uniques.tolist()], dtype=np.int16)
+    return codes_uniques[indices], libelles
+
+
+def normaliser_nom(nom):
+    # espaces en trop (doubles espaces, espaces autour) supprimés
+    return " ".join(nom.split())
+
+
+@lru_cache(maxsize=None)
+def abreger_nom(nom):
+    # "Prénom Nom" -> "Prénom N." ; un nom d'un seul mot est gardé tel quel
+    mots = nom.split()
+    if len(mots) < 2:
+        return nom
+    return mots[0] + " " + mots[1][0] + "."
+
+
+def encoder_personnes(colonnes_brutes):
+    """Registre des noms de l'équipage : un identifiant entier par personne.
+
+    Les colonnes Leader, Equipier et Troisième sont lues ligne par ligne
+    (leader0, equipier0, troisieme0, leader1...) pour que les identifiants
+    suivent l'ordre de première apparition. Chaque nom distinct n'est
+    normalisé qu'une fois. Retourne ({colonne: identifiants}, noms).
+    """
+    nb_lignes = len(colonnes_brutes[7])
+    equipage = np.column_stack([np.array(colonnes_brutes[index] or [""] * nb_lignes, dtype=str)
+                                for index in COLONNES_PERSONNES])
+    uniques, indices = grouper(equipage.reshape(-1))
+    codes, noms = encoder_categories(
+        [normaliser_nom(nom) for nom in uniques.tolist()])
+    identifiants = codes[indices].reshape(nb_lignes, len(COLONNES_PERSONNES))
+    return ({nom: identifiants[:, position]
+             for position, nom in enumerate(COLONNES_PERSONNES.values())}, noms)
+
+
+def charger_table(lecteur, en_tete=True):
+    if en_tete:
+        next(lecteur, None)  # saute l'en-tête
+    lignes = [ligne for ligne in lecteur if ligne]  # ignore les lignes vides
+    colonnes_brutes = list(zip_longest(*lignes, fillvalue=""))
+    if len(colonnes_brutes) < 33:
+        # colonnes absentes (ligne en cours d'écriture, par exemple) : cellules vides
+        colonnes_brutes += [("",) * len(lignes)] * (33 - len(colonnes_brutes))
+
+    colonnes = {}
+    categories = {}
+    for index, nom in COLONNES_TEXTE.items():
+        colonnes[nom] = np.array([v.strip()
+                                 for v in colonnes_brutes[index]], dtype=str)
+    identifiants, categories["personne"] = encoder_personnes(colonnes_brutes)
+    colonnes.update(identifiants)
+    heures_invalides = {}
+    for index, nom in COLONNES_HEURES.items():
+        textes = np.char.strip(np.array(colonnes_brutes[index], dtype=str))
+        colonnes[nom], valide = heures_en_minutes(textes)
+        # les heures remplies mais illisibles sont comptées pour être signalées
+        heures_invalides[nom] = int(np.count_nonzero(~valide & (textes != "")))
+
+    # on enlève les 2 premiers caractères "60" pour ne garder que le numéro
+    ambulances = [v.strip()[2:] for v in colonnes_brutes[10]]
+    for nom, valeurs, libelles_initiaux in (("priorite", colonnes_brutes[6], PRIORITES),
+                                            ("ambulance", ambulances, AMBULANCES),
+                                            ("naca", colonnes_brutes[26], NACAS),
+                                            ("motif_est", colonnes_brutes[24], ()),
+                                            ("degre_est", colonnes_brutes[25], ()),
+                                            ("jour_nuit", colonnes_brutes[2], ()),
+                                            ("commune", colonnes_brutes[20], ())):
+        colonnes[nom], categories[nom] = encoder_categories(
+            [v.strip() for v in valeurs], libelles_initiaux)
+
+    colonnes["a_date_naissance"] = np.array(
+        [v.strip() != "" for v in colonnes_brutes[31]], dtype=bool)
+    # un âge illisible ou trop grand pour un int16 (cellule corrompue) vaut -1
+    age_max = np.iinfo(np.int16).max
+    colonnes["age"] = np.array([int(v) if v.strip().isdigit() and int(v) <= age_max else -1
+                               for v in colonnes_brutes[32]], dtype=np.int16)
+    return TableInterventions(colonnes, categories, heures_invalides)
+
+
+# La table d'un export est gardée dans un fichier .npz nommé d'après le hash
+# du contenu du CSV. index.json retient pour chaque CSV sa taille, sa date de
+# modification et son hash : tant qu'elles ne changent pas, le fichier n'est
+# ni relu ni re-hashé. Si le CSV a été modifié, le hash change et l'export
+# est reparsé.
+CACHE_TABLES_DIR = "cache/tables"
+VERSION_CACHE_TABLES = 3  # à incrémenter quand les colonnes de TableInterventions changent
+
+
+def hash_fichier(chemin):
+    empreinte = hashlib.sha256()
+    with open(chemin, "rb") as fichier:
+        for bloc in iter(lambda: fichier.read(1024 * 1024), b""):
+            empreinte.update(bloc)
+    return empreinte.hexdigest()
+
+
+def table_vers_npz(table, chemin):
+    tableaux = {}
+    for nom, valeurs in table.colonnes.items():
+        if valeurs.dtype.kind == "U":
+            # texte très répétitif (noms, dates) : valeurs distinctes + indices
+            uniques, indices = np.unique(valeurs, return_inverse=True)
+            tableaux[f"texte.{nom}"] = uniques
+            tableaux[f"indices.{nom}"] = indices.reshape(-1).astype(np.int32)
+        else:
+            tableaux[f"colonne.{nom}"] = valeurs
+    for nom, libelles in table.categories.items():
+        tableaux[f"categorie.{nom}"] = np.array(libelles, dtype=str)
+    tableaux["heures_invalides"] = np.array(json.dumps(table.heures_invalides))
+    # écriture puis renommage : un autre processus ne lit jamais un fichier à moitié écrit
+    temporaire = f"{chemin}.{os.getpid()}.tmp"
+    with open(temporaire, "wb") as fichier:
+        np.savez(fichier, **tableaux)
+    os.replace(temporaire, chemin)
+
+
+def table_depuis_npz(chemin):
+    colonnes = {}
+    categories = {}
+    with np.load(chemin) as npz:
+        for cle in npz.files:
+            genre, _, nom = cle.partition(".")
+            if genre == "colonne":
+                colonnes[nom] = npz[cle]
+            elif genre == "texte":
+                colonnes[nom] = npz[cle][npz[f"indices.{nom}"]]
+            elif genre == "categorie":
+                categories[nom] = npz[cle].tolist()
+        heures_invalides = json.loads(npz["heures_invalides"].item())
+    return TableInterventions(colonnes, categories, heures_invalides)
+
+
+def lire_index_cache_tables():
+    try:
+        with open(f"{CACHE_TABLES_DIR}/index.json", encoding="utf-8") as fichier:
+            return json.load(fichier)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def ecrire_index_cache_tables(index):
+    temporaire = f"{CACHE_TABLES_DIR}/index.json.{os.getpid()}.tmp"
+    with open(temporaire, "w", encoding="utf-8") as fichier:
+        json.dump(index, fichier, indent=1)
+    os.replace(temporaire, f"{CACHE_TABLES_DIR}/index.json")
+
+
+def charger_table_fichier(chemin_fichier, cache=True):
+    """Table d'un export CSV, lue depuis le cache si le fichier n'a pas changé."""
+    if not cache:
+        return charger_table_parallele(chemin_fichier)
+
+    os.makedirs(CACHE_TABLES_DIR, exist_ok=True)
+    infos = os.stat(chemin_fichier)
+    cle_index = os.path.abspath(chemin_fichier)
+    index = lire_index_cache_tables()
+    entree = index.get(cle_index)
+    if entree is None or entree["taille"] != infos.st_size or entree["mtime_ns"] != infos.st_mtime_ns:
+        # fichier inconnu ou modifié : le hash du contenu dit s'il a vraiment changé
+        entree = {"taille": infos.st_size, "mtime_ns": infos.st_mtime_ns,
+                  "hash": hash_fichier(chemin_fichier)}
+        index[cle_index] = entree
+        ecrire_index_cache_tables(index)
+
+    chemin_npz = f"{CACHE_TABLES_DIR}/{entree['hash']}.v{VERSION_CACHE_TABLES}.npz"
+    if os.path.exists(chemin_npz):
+        return table_depuis_npz(chemin_npz)
+
+    table = charger_table_fichier(chemin_fichier, cache=False)
+    table_vers_npz(table, chemin_npz)
+    return table
+
+
+class Agregateur(ABC):
+    """Statistique calculée sur une table d'interventions.
+
+    `ajouter` peut être appelé plusieurs fois (une table par morceau de
+    fichier), `resultat` retourne la valeur attendue par les graphiques
+    et le PDF. `fusionner` ajoute l'état d'un agrégateur du même type
+    calculé sur d'autres lignes (un autre mois, par exemple).
+    """
+
+    @abstractmethod
+    def ajouter(self, table):
+        pass
+
+    @abstractmethod
+    def resultat(self):
+        pass
+
+    def fusionner(self, autre):
+        # par défaut tout l'état est fait de compteurs et de sommes
+        for nom, valeur in vars(autre).items():
+            setattr(self, nom, additionner(getattr(self, nom), valeur))
+
+
+def additionner(a, b):
+    # somme de deux états : dicts clé par clé (récursivement), tableaux
+    # NumPy de longueurs différentes complétés par des zéros, nombres
+    if isinstance(a, dict):
+        somme = dict(a)
+        for cle, valeur in b.items():
+            somme[cle] = additionner(somme[cle], valeur) if cle in somme else copy.deepcopy(valeur)
+        return somme
+    if isinstance(a, np.ndarray):
+        longueur = max(len(a), len(b))
+        return np.pad(a, (0, longueur - len(a))) + np.pad(b, (0, longueur - len(b)))
+    return a + b
+
+
+def calculer_table(table, agregateurs):
+    """Donne la table à tous les agrégateurs.
+
+    `agregateurs` est un dict nom -> agrégateur, le résultat est un dict
+    nom -> résultat de l'agrégateur.
+    """
+    for nom, agregateur in agregateurs.items():
+        with Etape(nom, lignes=len(table)):
+            agregateur.ajouter(table)
+    return {nom: agregateur.resultat() for nom, agregateur in agregateurs.items()}
+
+
+# Nombre de lignes lues à la fois par calculer() : la mémoire utilisée ne
+# dépend que de cette taille et de l'état des agrégateurs (compteurs,
+# sommes, histogrammes par clé, segments d'occupation bornés par la
+# période couverte), pas du nombre de lignes de l'export.
+TAILLE_BLOC = 50_000
+
+
+def tables_par_blocs(lecteur, taille_bloc=TAILLE_BLOC):
+    # une table par bloc de taille_bloc lignes, l'en-tête sauté
+    next(lecteur, None)
+    while True:
+        bloc = list(islice(lecteur, taille_bloc))
+        if not bloc:
+            return
+        yield charger_table(bloc, en_tete=False)
+
+
+def calculer(lecteur, agregateurs, heures_invalides=None):
+    """Calcule les agrégateurs en lisant le fichier bloc par bloc.
+
+    Si `heures_invalides` est un dict, il reçoit le nombre d'heures
+    illisibles de chaque colonne, cumulé sur tous les blocs.
+    """
+    for table in tables_par_blocs(lecteur):
+        for agregateur in agregateurs.values():
+            agregateur.ajouter(table)
+        if heures_invalides is not None:
+            for colonne, nombre in table.heures_invalides.items():
+                heures_invalides[colonne] = heures_invalides.get(colonne, 0) + nombre
+    return {nom: agregateur.resultat() for nom, agregateur in agregateurs.items()}
+
+
+def calculer_un(lecteur, agregateur):
+    return calculer(lecteur, {"resultat": agregateur})["resultat"]
+
+
+def ajouter_comptes(compteur, codes, libelles):
+    # ajoute au dict libellé -> nombre les occurrences des codes (hors -1)
+    comptes = np.bincount(codes[codes >= 0], minlength=len(libelles))
+    for libelle, nombre in zip(libelles, comptes.tolist()):
+        if nombre or libelle in compteur:
+            compteur[libelle] = compteur.get(libelle, 0) + nombre
+
+
+def personnes_entrelacees(table, masque):
+    # identifiants du leader et de l'équipier des lignes du masque, dans
+    # l'ordre des lignes : [leader0, equipier0, leader1, equipier1, ...]
+    leaders = table["leader"][masque]
+    personnes = np.empty(2 * len(leaders), dtype=leaders.dtype)
+    personnes[0::2] = leaders
+    personnes[1::2] = table["equipier"][masque]
+    return personnes
+
+
+def ajouter_par_personne(compteur, table, personnes, poids=None):
+    # ajoute au dict nom -> total le nombre d'apparitions (ou la somme des
+    # poids) de chaque identifiant de personne, dans l'ordre de première
+    # apparition ; les cellules vides (-1) sont ignorées
+    renseignees = personnes >= 0
+    personnes = personnes[renseignees]
+    if poids is not None:
+        poids = poids[renseignees]
+    noms = table.categories["personne"]
+    totaux = np.bincount(personnes, weights=poids, minlength=len(noms))
+    presentes, premieres = np.unique(personnes, return_index=True)
+    for identifiant in presentes[np.argsort(premieres)].tolist():
+        nom = noms[identifiant]
+        compteur[nom] = compteur.get(nom, 0) + totaux[identifiant].item()
+
+
+def classement(valeurs, k, cle=None, support=None, support_min=0, plus_petits=False):
+    """Les k premières entrées du dict `valeurs`, par valeur décroissante.
+
+    Les entrées à égalité avec la k-ième sont toutes gardées, dans l'ordre
+    du dict ; k=None garde tout. `cle(valeur)` donne le critère du tri (la
+    valeur elle-même par défaut), `plus_petits` classe par valeur
+    croissante. Avec `support` (dict clé -> effectif), seules les clés d'un
+    effectif d'au moins `support_min` sont classées. Un tas de taille k
+    trouve la k-ième valeur en O(n log k), seules les entrées retenues
+    sont triées.
+    """
+    if cle is None:
+        def cle(valeur):
+            return valeur
+    entrees = [(nom, valeur) for nom, valeur in valeurs.items()
+               if support is None or support.get(nom, 0) >= support_min]
+    if k is not None and len(entrees) > k:
+        choisir = heapq.nsmallest if plus_petits else heapq.nlargest
+        seuil = cle(choisir(k, entrees, key=lambda entree: cle(entree[1]))[-1][1])
+        entrees = [(nom, valeur) for nom, valeur in entrees
+                   if (cle(valeur) <= seuil if plus_petits else cle(valeur) >= seuil)]
+    return dict(sorted(entrees, key=lambda entree: cle(entree[1]), reverse=not plus_petits))
+
+
+class NombreInterventions(Agregateur):
+    def __init__(self):
+        self.nombre = 0
+
+    def ajouter(self, table):
+        self.nombre += len(table)
+
+    def resultat(self):
+        return self.nombre
+
+
+class TempsSurSite(Agregateur):
+    def __init__(self):
+        self.total_minutes = 0
+        self.nombre_lignes = 0
+
+    def ajouter(self, table):
+        # si la colonne Hopital est vide, on ignore la ligne
+        durees, valide = durees_entre(table, "sur_site", "quebec")
+        duree = durees[valide & (table["hopital"] >= 0)]
+        self.nombre_lignes += len(duree)
+        self.total_minutes += int(duree.sum())
+
+    def resultat(self):
+        total_temps = self.total_minutes / 60
+        return {"total_temps_sur_site": total_temps, "nombre_interventions": self.nombre_lignes, "moyenne": total_temps / self.nombre_lignes if self.nombre_lignes > 0 else 0}
 
-        nombre_lignes += 1
-        temps_sur_site = quebec_hour - sur_site_hour
-        if temps_sur_site < 0:
-            temps_sur_site += 24  # gérer les cas où l'heure de Québec est le lendemain
-        total_temps += temps_sur_site
-        # print(f"Sur site = {sur_site_hour}, Quebec = {quebec_hour}, Temps sur site = {decimal_vers_hhmm(temps_sur_site)}")
 
-    # print(f"Nombre de lignes (interventions) comptées : {nombre_lignes}")
-    # print(f"Temps total sur site : {decimal_vers_hhmm(total_temps)}")
-    # print(
-    #     f"Temps moyen sur site : {decimal_vers_hhmm(total_temps / nombre_lignes)}")
-    return {"total_temps_sur_site": total_temps, "nombre_interventions": nombre_lignes, "moyenne": total_temps / nombre_lignes if nombre_lignes > 0 else 0}
+def get_temps_sur_site(lecteur):
+    return calculer_un(lecteur, TempsSurSite())
+
+
+# durées dont on suit la répartition : nom -> (heure de début, heure de fin)
+DUREES_SUIVIES = {"sur_site_quebec": ("sur_site", "quebec"),
+                  "alarme_hopital": ("alarme", "hopital")}
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+
+class QuantilesDurees(Agregateur):
+    def __init__(self):
+        # les durées sont des minutes entières : un histogramme (une case
+        # par minute, 24 * 60 au départ, agrandi pour les missions plus
+        # longues) par durée et par priorité est exact, et les mois se
+        # fusionnent en additionnant les cases
+        self.histogrammes = {nom: {priorite: np.zeros(24 * 60, dtype=np.int64) for priorite in ["toutes"] + PRIORITES}
+                             for nom in DUREES_SUIVIES}
+
+    def ajouter(self, table):
+        libelles = table.categories["priorite"]
+        for nom, (debut, fin) in DUREES_SUIVIES.items():
+            # comme pour le temps sur site, on ignore les lignes sans hôpital,
+            # mais on garde les durées de plus de 10h
+            durees, valide = durees_entre(table, debut, fin)
+            valide &= table["hopital"] >= 0
+            histogrammes = self.histogrammes[nom]
+            durees = durees[valide]
+            largeur = max(24 * 60, int(durees.max()) + 1 if len(durees) else 0)
+            histogrammes["toutes"] = additionner(histogrammes["toutes"], np.bincount(durees, minlength=largeur))
+
+            priorites = table["priorite"][valide]
+            connues = priorites >= 0
+            comptes = np.bincount(priorites[connues].astype(np.int64) * largeur + durees[connues],
+                                  minlength=len(libelles) * largeur).reshape(-1, largeur)
+            for code in np.flatnonzero(comptes.any(axis=1)).tolist():
+                histogrammes[libelles[code]] = additionner(
+                    histogrammes.get(libelles[code], np.zeros(0, dtype=np.int64)), comptes[code])
+
+    def resultat(self):
+        # {durée: {priorité: {"nombre": n, "p50": minutes, ...}}}, les priorités sans intervention omises
+        return {nom: {priorite: quantiles_histogramme(histogramme)
+                      for priorite, histogramme in histogrammes.items() if histogramme.any()}
+                for nom, histogrammes in self.histogrammes.items()}
+
+
+def quantiles_histogramme(histogramme):
+    # nombre de valeurs et QUANTILES (au rang le plus proche) d'un histogramme
+    # dont la case i compte les durées de i minutes
+    cumul = np.cumsum(histogramme)
+    nombre = int(cumul[-1])
+    quantiles = {nom: int(np.searchsorted(cumul, max(1, int(np.ceil(q * nombre))))) for nom, q in QUANTILES.items()}
+    return {"nombre": nombre, **quantiles}
+
+
+def get_quantiles_durees(lecteur):
+    return calculer_un(lecteur, QuantilesDurees())
+
+
+# totaux tenus pour chaque personne par StatsParPersonne, en plus de l'histogramme des NACAs
+CHAMPS_PAR_PERSONNE = ["interventions", "avec_heure_sur_site", "nuit", "pediatriques",
+                       "departs_a_midi", "nombre_ages", "somme_ages"]
+
+
+class StatsParPersonne(Agregateur):
+    """Statistiques de chaque personne (leader ou équipier), en un seul passage.
+
+    Tous les classements par personne du rapport en sont tirés par
+    classements_par_personne().
+    """
+
+    def __init__(self):
+        # personne -> {champ de CHAMPS_PAR_PERSONNE: total, "nacas": {naca: nombre}},
+        # les personnes dans l'ordre de première apparition
+        self.par_personne = {}
+
+    def ajouter(self, table):
+        # chaque ligne compte pour son leader et pour son équipier
+        personnes = personnes_entrelacees(table, slice(None))
+        renseignees = personnes >= 0
+        personnes = personnes[renseignees].astype(np.int64)
+        nb_personnes = len(table.categories["personne"])
+
+        heures_sur_site = table["sur_site"] // 60
+        ages = table["age"]
+        par_ligne = {
+            "interventions": np.ones(len(table)),
+            "avec_heure_sur_site": table["sur_site"] >= 0,
+            # on considère la nuit de 2h à 6h
+            "nuit": (table["sur_site"] >= 0) & (heures_sur_site >= 2) & (heures_sur_site < 6),
+            "pediatriques": (ages >= 0) & (ages < 16),
+            "departs_a_midi": (table["depart"] >= 0) & (table["depart"] // 60 == 12),
+            "nombre_ages": ages >= 0,
+            "somme_ages": np.where(ages >= 0, ages, 0),
+        }
+        # tableau personne x champ des totaux
+        totaux = np.stack([np.bincount(personnes, weights=np.repeat(par_ligne[champ], 2)[renseignees], minlength=nb_personnes)
+                           for champ in CHAMPS_PAR_PERSONNE], axis=1).astype(np.int64)
+
+        # tableau personne x NACA des comptes
+        libelles = table.categories["naca"]
+        nacas = np.repeat(table["naca"], 2)[renseignees]
+        avec_naca = nacas >= 0
+        comptes_nacas = np.bincount(personnes[avec_naca] * len(libelles) + nacas[avec_naca],
+                                    minlength=nb_personnes * len(libelles)).reshape(-1, len(libelles))
+
+        presentes, premieres = np.unique(personnes, return_index=True)
+        for personne in presentes[np.argsort(premieres)].tolist():
+            stats = self.par_personne.setdefault(table.personne(personne), {
+                **dict.fromkeys(CHAMPS_PAR_PERSONNE, 0), "nacas": {}})
+            for champ, total in zip(CHAMPS_PAR_PERSONNE, totaux[personne].tolist()):
+                stats[champ] += total
+            for naca in np.flatnonzero(comptes_nacas[personne]).tolist():
+                stats["nacas"][libelles[naca]] = stats["nacas"].get(
+                    libelles[naca], 0) + int(comptes_nacas[personne, naca])
+
+    def resultat(self):
+        return self.par_personne
 
 
 def get_naca_by_personne(lecteur):
-    naca_par_personne = {}
-    next(lecteur, None)  # saute l'en-tête
+    return classements_lecteur(lecteur)["naca_by_personne"]
 
-    for ligne in lecteur:
-        leader = ligne[7].strip()
-        equipier = ligne[8].strip()
-        naca = ligne[26].strip()
 
-        if leader and naca:
-            if leader not in naca_par_personne:
-                naca_par_personne[leader] = []
-            naca_par_personne[leader].append(naca)
+class NacaDesP3(Agregateur):
+    def __init__(self):
+        self.naca_of_p3 = {naca: 0 for naca in NACAS}
 
-        if equipier and naca:
-            if equipier not in naca_par_personne:
-                naca_par_personne[equipier] = []
-            naca_par_personne[equipier].append(naca)
+    def ajouter(self, table):
+        masque = np.isin(table["priorite"], table.codes(
+            "priorite", lambda p: p == "P3"))
+        ajouter_comptes(self.naca_of_p3,
+                        table["naca"][masque], table.categories["naca"])
 
-    # on garde uniquement les personnes qui ont au moins LIMITE_MIN_INTER interventions pour éviter les biais liés à un petit nombre d'interventions
-    naca_par_personne = {personne: nacas for personne, nacas in naca_par_personne.items(
-    ) if len(nacas) >= LIMITE_MIN_INTER}
-    return naca_par_personne
+    def resultat(self):
+        return self.naca_of_p3
 
 
 def get_naca_of_p3(lecteur):
-    naca_of_p3 = {"0": 0, "1": 0, "2": 0, "3": 0,
-                  "4": 0, "5": 0, "6": 0, "7": 0, "9": 0}
-    next(lecteur, None)  # saute l'en-tête
+    return calculer_un(lecteur, NacaDesP3())
 
-    for ligne in lecteur:
-        priorite = ligne[6].strip()
-        naca = ligne[26].strip()
 
-        if priorite == "P3" and naca:
-            naca_of_p3[naca] += 1
+class RepartitionMotifEst(Agregateur):
+    def __init__(self):
+        self.motifs = {}
 
-    return naca_of_p3
+    def ajouter(self, table):
+        ajouter_comptes(self.motifs, table["motif_est"],
+                        table.categories["motif_est"])
+
+    def resultat(self):
+        return dict(
+            sorted(self.motifs.items(), key=lambda item: item[1], reverse=True))
 
 
 def repartition_motif_est(lecteur):
-    motifs = {}
-    next(lecteur, None)  # saute l'en-tête
+    return calculer_un(lecteur, RepartitionMotifEst())
+
 
-    for ligne in lecteur:
-        motif = ligne[24].strip()
-        if motif[:4]:
-            if motif not in motifs:
-                motifs[motif] = 0
-            motifs[motif] += 1
+class RepartitionPriorites(Agregateur):
+    def __init__(self):
+        self.priorites = {priorite: 0 for priorite in PRIORITES}
 
-    total_interventions = sum(motifs.values())
-    motifs = dict(
-        sorted(motifs.items(), key=lambda item: item[1], reverse=True))
-    return motifs
+    def ajouter(self, table):
+        ajouter_comptes(self.priorites,
+                        table["priorite"], table.categories["priorite"])
+
+    def resultat(self):
+        return self.priorites
 
 
 def repartition_priorites(lecteur):
-    priorites = {"P1": 0, "P2": 0, "P3": 0,
-                 "S1 feux bleus": 0, "S1 sans feux bleus": 0}
-    next(lecteur, None)  # saute l'en-tête
+    return calculer_un(lecteur, RepartitionPriorites())
+
+
+# Style commun des graphiques
+DPI_GRAPHIQUES = 300
+FIGSIZE_BARRES = (6.4, 4.8)
+FIGSIZE_AGES = (6, 4)
+
+PALETTE_PRIORITE = {
+    "P1": "#D62828",
+    "P2": "#F2C94C",
+    "P3": "#27AE60",
+    "S1 feux bleus": "#D62828",
+    "S1 sans feux bleus": "#E67E22",
+    "S2": "#F2C94C"
+}
+
+PALETTE_AMBULANCES = ['#1D3557', '#457B9D']  # couleurs alternées
+
+PALETTE_NACA = {
+    '0': "#6FCF97",
+    '1': "#27AE60",
+    '2': "#F2C94C",
+    '3': "#F2994A",
+    '4': "#E67E22",
+    '5': "#D62828",
+    '6': "#1D3557",
+    '7': "#000000",
+    '9': "#FFFFFF"
+}
+
+PALETTE_HEURES = {
+    # Nuit profonde
+    '00': "#0B132B",
+    '01': "#0B132B",
+    '02': "#1C2541",
+    '03': "#1C2541",
+    '04': "#3A506B",
+
+    # Aube
+    '05': "#5BC0BE",
+    '06': "#89C2D9",
+    '07': "#A9D6E5",
+
+    # Matin
+    '08': "#F1FAEE",
+    '09': "#FFE8A1",
+    '10': "#FFD166",
+    '11': "#FFC43D",
+
+    # Midi (maximum activité lumineuse)
+    '12': "#FFB703",
+    '13': "#FFB703",
+    '14': "#FFD166",
+
+    # Après-midi
+    '15': "#F4A261",
+    '16': "#E76F51",
+    '17': "#D62828",
+
+    # Soirée
+    '18': "#BC4749",
+    '19': "#6D597A",
+    '20': "#355070",
+
+    # Nuit
+    '21': "#1D3557",
+    '22': "#1D3557",
+    '23': "#0B132B"
+}
+
+
+# Les PNG déjà dessinés sont gardés dans un cache, sous une clé calculée à
+# partir des données, du style et du code de la fonction de dessin : un
+# graphique dont rien n'a changé est copié au lieu d'être redessiné.
+CACHE_GRAPHIQUES_DIR = "cache/graphiques"
+CACHE_GRAPHIQUES_TAILLE_MAX = 200 * 1024 * 1024  # en octets
+
+
+def empreinte_code(code):
+    # bytecode et constantes (titres, libellés...) de la fonction, sans les
+    # adresses mémoire des fonctions imbriquées
+    morceaux = [code.co_code]
+    for constante in code.co_consts:
+        if hasattr(constante, "co_code"):
+            morceaux.append(empreinte_code(constante))
+        else:
+            morceaux.append(repr(constante).encode())
+    return b"\0".join(morceaux)
+
+
+def cle_graphique(fonction, donnees, *style):
+    import matplotlib
+    contenu = json.dumps([fonction.__name__, donnees, style, DPI_GRAPHIQUES, matplotlib.__version__],
+                         default=lambda valeur: valeur.item() if hasattr(valeur, "item") else str(valeur))
+    empreinte = hashlib.sha256(contenu.encode())
+    empreinte.update(empreinte_code(fonction.__code__))
+    return empreinte.hexdigest()
+
+
+def graphique_depuis_cache(cle, graph_path):
+    # copie le PNG en cache vers graph_path, False s'il n'est pas (ou plus) en cache
+    chemin_cache = f"{CACHE_GRAPHIQUES_DIR}/{cle}.png"
+    try:
+        shutil.copyfile(chemin_cache, graph_path)
+        os.utime(chemin_cache)  # dernière utilisation, pour l'éviction LRU
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def graphique_vers_cache(cle, graph_path):
+    os.makedirs(CACHE_GRAPHIQUES_DIR, exist_ok=True)
+    # copie puis renommage : un autre processus ne voit jamais un PNG à moitié écrit
+    temporaire = f"{CACHE_GRAPHIQUES_DIR}/{cle}.{os.getpid()}.tmp"
+    shutil.copyfile(graph_path, temporaire)
+    os.replace(temporaire, f"{CACHE_GRAPHIQUES_DIR}/{cle}.png")
+    nettoyer_cache(CACHE_GRAPHIQUES_DIR, CACHE_GRAPHIQUES_TAILLE_MAX)
+
+
+def nettoyer_cache(dossier, taille_max):
+    # supprime les fichiers utilisés le moins récemment jusqu'à repasser sous taille_max
+    fichiers = []
+    for entree in os.scandir(dossier):
+        if entree.is_file() and not entree.name.endswith(".tmp"):
+            infos = entree.stat()
+            fichiers.append((infos.st_mtime, infos.st_size, entree.path))
+    taille = sum(taille_fichier for _, taille_fichier, _ in fichiers)
+    for _, taille_fichier, chemin in sorted(fichiers):
+        if taille <= taille_max:
+            break
+        try:
+            os.remove(chemin)
+        except FileNotFoundError:
+            pass  # déjà supprimé par un autre processus
+        taille -= taille_fichier
 
-    for ligne in lecteur:
-        priorite = ligne[6].strip()
-        if priorite:
-            if priorite not in priorites:
-                priorites[priorite] = 0
-            priorites[priorite] += 1
 
-    total_interventions = sum(priorites.values())
-    # for p, count in priorites.items():
-    #     pourcentage = (count / total_interventions) * 100
-    #     print(f"Priorité {p} : {count} interventions ({pourcentage:.2f}%)")
-    return priorites
+def nouvelle_figure(figsize=None):
+    # figure indépendante de pyplot (pas d'état global), dessinée avec le
+    # backend Agg : les graphiques peuvent être générés dans des processus
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots()
 
 
-def create_graph_priorites(priorites):
+def create_graph_priorites(priorites, graph_path=GRAPH_PRIORITES_PATH):
+    cle = cle_graphique(create_graph_priorites, priorites, PALETTE_PRIORITE, FIGSIZE_BARRES)
+    if graphique_depuis_cache(cle, graph_path):
+        return
+
     total_interventions = sum(priorites.values())
-    palette_priorite = {
-        "P1": "#D62828",
-        "P2": "#F2C94C",
-        "P3": "#27AE60",
-        "S1 feux bleus": "#D62828",
-        "S1 sans feux bleus": "#E67E22",
-        "S2": "#F2C94C"
-    }
-    plt.figure()
-    plt.bar(priorites.keys(), priorites.values(), color=[
-            palette_priorite[k] for k in priorites.keys()], edgecolor='black')
+    fig, ax = nouvelle_figure(FIGSIZE_BARRES)
+    ax.bar(priorites.keys(), priorites.values(), color=[
+            PALETTE_PRIORITE[k] for k in priorites.keys()], edgecolor='black')
     # print percentage on each bar
     for i, v in enumerate(priorites.values()):
         pourcentage = (v / total_interventions) * \
             100 if total_interventions > 0 else 0
-        plt.text(i, v + 2, f"{pourcentage:.2f}%", ha='center')
-    plt.title("Répartition des interventions par priorités")
-    plt.ylabel("Nombre d'interventions")
-    plt.xticks(rotation=15)
-    plt.tight_layout()
+        ax.text(i, v + 2, f"{pourcentage:.2f}%", ha='center')
+    ax.set_title("Répartition des interventions par priorités")
+    ax.set_ylabel("Nombre d'interventions")
+    ax.tick_params(axis='x', labelrotation=15)
+    fig.tight_layout()
 
-    graph_path = GRAPH_PRIORITES_PATH
-    plt.savefig(graph_path, dpi=300)
-    plt.close()
+    fig.savefig(graph_path, dpi=DPI_GRAPHIQUES)
+    graphique_vers_cache(cle, graph_path)
 
 
-def repartition_ambulances(lecteur):
-    ambulances = {"704": 0, "705": 0, "706": 0, "707": 0, "708": 0, "709": 0}
-    next(lecteur, None)  # saute l'en-tête
+class RepartitionAmbulances(Agregateur):
+    def __init__(self):
+        self.ambulances = {ambulance: 0 for ambulance in AMBULANCES}
 
-    for ligne in lecteur:
-        # on enlève les 2 premiers caractères "60" pour ne garder que le numéro
-        ambulance = ligne[10].strip()[2:]
-        if ambulance:
-            if ambulance not in ambulances:
-                ambulances[ambulance] = 0
-            ambulances[ambulance] += 1
+    def ajouter(self, table):
+        ajouter_comptes(self.ambulances,
+                        table["ambulance"], table.categories["ambulance"])
 
-    total_interventions = sum(ambulances.values())
-    # for a, count in ambulances.items():
-    #     pourcentage = (count / total_interventions) * 100
-    #     print(f"Ambulance {a} : {count} interventions ({pourcentage:.2f}%)")
-    return ambulances
+    def resultat(self):
+        return self.ambulances
 
 
-def create_graph_ambulances(ambulances):
+def repartition_ambulances(lecteur):
+    return calculer_un(lecteur, RepartitionAmbulances())
+
+
+def courbe_occupation(debuts, fins, poids=None):
+    """Nombre d'intervalles [debut, fin) en cours au fil du temps, par balayage.
+
+    Les 2n bornes sont triées (O(n log n)). Avec `poids`, chaque intervalle
+    compte pour son poids au lieu de 1. Retourne (instants, niveaux) :
+    niveaux[i] intervalles sont en cours de instants[i] à instants[i + 1],
+    le dernier niveau vaut 0.
+    """
+    if poids is None:
+        poids = np.ones(len(debuts), dtype=np.int64)
+    instants = np.concatenate([fins, debuts]).astype(np.int64)
+    pas = np.concatenate([-poids, poids]).astype(np.int64)
+    ordre = np.lexsort((pas, instants))
+    instants, niveaux = instants[ordre], np.cumsum(pas[ordre])
+    # un seul niveau par instant : celui d'après toutes ses bornes
+    derniers = np.ones(len(instants), dtype=bool)
+    derniers[:-1] = instants[1:] != instants[:-1]
+    return instants[derniers], niveaux[derniers]
+
+
+def segments_occupation(instants, niveaux):
+    # segments (debuts, fins, niveaux) de niveau non nul d'une courbe de
+    # courbe_occupation, les segments consécutifs de même niveau réunis ;
+    # gardés dans des entiers courts (les minutes depuis l'an 1 tiennent dans
+    # un int32 jusqu'en l'an 4000)
+    garder = np.ones(len(instants), dtype=bool)
+    garder[1:] = niveaux[1:] != niveaux[:-1]
+    instants, niveaux = instants[garder], niveaux[garder]
+    occupes = np.flatnonzero(niveaux[:-1] > 0)
+    return (instants[occupes].astype(np.int32), instants[occupes + 1].astype(np.int32),
+            niveaux[occupes].astype(np.int16))
+
+
+def additionner_segments(a, b):
+    # segments de la somme de deux courbes données par leurs segments
+    debuts, fins, niveaux = (np.concatenate([x, y]) for x, y in zip(a, b))
+    return segments_occupation(*courbe_occupation(debuts, fins, niveaux))
+
+
+def minutes_par_heure(instants, niveaux, jours):
+    """Minutes-intervalles en cours pendant chaque heure des jours donnés.
+
+    `instants` et `niveaux` sont une courbe de courbe_occupation, `jours`
+    des numéros de jour (date.toordinal). L'intégrale de la courbe n'est
+    évaluée qu'aux changements de niveau et aux bornes des heures de ces
+    jours : le coût ne dépend pas de la durée occupée, et ce qui déborde
+    sur un autre jour n'est pas compté. Retourne un tableau (jours, 24).
+    """
+    bornes = (np.asarray(jours, dtype=np.int64)[:, None] * 24 + np.arange(25)) * 60
+    if len(instants) == 0:
+        return np.zeros((len(bornes), 24), dtype=np.int64)
+    # intégrale de la courbe jusqu'à chaque changement, puis jusqu'à chaque borne
+    integrale = np.concatenate([[0], np.cumsum(np.diff(instants) * niveaux[:-1])])
+    i = np.maximum(np.searchsorted(instants, bornes, side="right") - 1, 0)
+    cumul = np.where(bornes < instants[0], 0, integrale[i] + niveaux[i] * (bornes - instants[i]))
+    return np.diff(cumul, axis=1)
+
+
+def texte_instant(minutes):
+    # minutes depuis le 1er janvier de l'an 1 -> "jj.mm.aaaa à 14h05"
+    return f"{datetime.fromordinal(minutes // (24 * 60)).strftime('%d.%m.%Y')} à {minutes_vers_hhmm(minutes % (24 * 60))}"
+
+
+class OccupationFlotte(Agregateur):
+    """Occupation des ambulances, d'après l'intervalle alarme -> libre de chaque mission.
+
+    Une mission occupe son ambulance de sa première à sa dernière heure
+    renseignée (voir horodatages_phases) ; les lignes sans date lisible ou
+    sans ambulance sont ignorées. Les missions de chaque table sont aussitôt
+    réunies en segments d'occupation de niveau constant : l'état dépend du
+    nombre de changements d'occupation (au plus un par minute et par
+    ambulance sur la période couverte), pas du nombre de lignes.
+    """
+
+    def __init__(self):
+        # ambulance -> segments (debuts, fins, niveaux) : de debut à fin, niveau missions en cours
+        self.segments = {}
+        # ambulance -> nombre de missions
+        self.missions = {}
+        # jour (date.toordinal) -> nombre de missions, pour connaître les jours couverts
+        self.jours = {}
+
+    def ajouter_missions(self, ambulance, debuts, fins):
+        # ajoute des missions [debut, fin) d'une ambulance à ses segments
+        self.missions[ambulance] = self.missions.get(ambulance, 0) + len(debuts)
+        segments = segments_occupation(*courbe_occupation(debuts, fins))
+        if ambulance in self.segments:
+            segments = additionner_segments(self.segments[ambulance], segments)
+        self.segments[ambulance] = segments
+
+    def ajouter(self, table):
+        horodatages = np.stack([table.horodatages()[phase] for phase in PHASES])
+        debuts = np.where(horodatages >= 0, horodatages, np.iinfo(np.int64).max).min(axis=0)
+        fins = horodatages.max(axis=0)
+        jours = jours_depuis_dates(table["date"])
+        masque = (jours >= 0) & (fins > debuts) & (table["ambulance"] >= 0)
+
+        uniques, comptes = np.unique(jours[jours >= 0], return_counts=True)
+        for jour, nombre in zip(uniques.tolist(), comptes.tolist()):
+            self.jours[jour] = self.jours.get(jour, 0) + nombre
+        libelles = table.categories["ambulance"]
+        ambulances = table["ambulance"][masque]
+        for code in np.unique(ambulances).tolist():
+            lignes = np.flatnonzero(masque)[ambulances == code]
+            self.ajouter_missions(libelles[code], debuts[lignes], fins[lignes])
+
+    def fusionner(self, autre):
+        self.jours = additionner(self.jours, autre.jours)
+        self.missions = additionner(self.missions, autre.missions)
+        for ambulance, segments in autre.segments.items():
+            if ambulance in self.segments:
+                segments = additionner_segments(self.segments[ambulance], segments)
+            self.segments[ambulance] = segments
+
+    def resultat(self):
+        """Pic d'occupation, temps avec toutes les ambulances occupées, taux par ambulance.
+
+        "occupation_moyenne" donne, pour chaque jour de la semaine (lundi
+        d'abord) et chaque heure, le nombre moyen d'ambulances de AMBULANCES
+        occupées sur les jours couverts par l'export.
+        """
+        nb_jours = len(self.jours)
+        par_ambulance = {}
+        periodes = []  # segments occupés des ambulances de la flotte
+        vides = segments_occupation(np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        for ambulance in AMBULANCES + [a for a in self.segments if a not in AMBULANCES]:
+            debuts, fins, niveaux = self.segments.get(ambulance, vides)
+            minutes = int((fins - debuts).sum(dtype=np.int64))
+            par_ambulance[ambulance] = {
+                "missions": self.missions.get(ambulance, 0),
+                # plus d'une mission à la fois : chevauchement dans l'export
+                "pic": int(niveaux.max(initial=0)),
+                "minutes_occupees": minutes,
+                "taux": minutes / (nb_jours * 24 * 60) if nb_jours else 0}
+            if ambulance in AMBULANCES:
+                periodes.append((debuts, fins))
+
+        # les segments d'une ambulance sont disjoints : chacun compte pour une ambulance occupée
+        debuts = np.concatenate([d for d, _ in periodes])
+        fins = np.concatenate([f for _, f in periodes])
+        instants, niveaux = courbe_occupation(debuts, fins)
+        pic = int(niveaux.max(initial=0))
+        durees = np.diff(instants)
+        minutes_toutes = int(durees[niveaux[:-1] >= len(AMBULANCES)].sum()) if len(instants) else 0
+
+        # minutes-ambulances occupées par (jour de la semaine, heure), sur les seuls jours couverts
+        jours = np.array(sorted(self.jours), dtype=np.int64)
+        # date.fromordinal(1) est un lundi
+        jours_semaine = (jours - 1) % 7
+        occupees = np.zeros((7, 24), dtype=np.int64)
+        np.add.at(occupees, jours_semaine, minutes_par_heure(instants, niveaux, jours))
+        nb_jours_semaine = np.bincount(jours_semaine, minlength=7)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            moyenne = np.where(nb_jours_semaine[:, None] > 0, occupees / (nb_jours_semaine[:, None] * 60), 0)
+        return {"nb_ambulances": len(AMBULANCES),
+                "pic": pic,
+                "debut_pic": texte_instant(int(instants[np.argmax(niveaux)])) if pic else None,
+                "minutes_toutes_occupees": minutes_toutes,
+                "jours": nb_jours,
+                "par_ambulance": par_ambulance,
+                "occupation_moyenne": moyenne.round(3).tolist()}
+
+
+def get_occupation_flotte(lecteur):
+    return calculer_un(lecteur, OccupationFlotte())
+
+
+JOURS_SEMAINE = ["Lun", "Mar", "Mer", "Jeu", "Ven", "Sam", "Dim"]
+
+
+def create_graph_occupation(occupation, graph_path=GRAPH_OCCUPATION_PATH):
+    cle = cle_graphique(create_graph_occupation, occupation["occupation_moyenne"], FIGSIZE_BARRES)
+    if graphique_depuis_cache(cle, graph_path):
+        return
+
+    from matplotlib.colors import LinearSegmentedColormap
+    fig, ax = nouvelle_figure(FIGSIZE_BARRES)
+    palette = LinearSegmentedColormap.from_list("occupation", ["#FFFFFF", "#F4A261", "#D62828", "#1D3557"])
+    image = ax.imshow(occupation["occupation_moyenne"], cmap=palette, aspect="auto",
+                      vmin=0, vmax=occupation["nb_ambulances"])
+    ax.set_yticks(range(7), JOURS_SEMAINE)
+    ax.set_xticks(range(0, 24, 2), [f"{heure:02d}" for heure in range(0, 24, 2)])
+    ax.set_title("Ambulances occupées en moyenne")
+    ax.set_xlabel("Heure")
+    fig.colorbar(image, ax=ax, orientation="horizontal", pad=0.18, fraction=0.06)
+    fig.tight_layout()
+
+    fig.savefig(graph_path, dpi=DPI_GRAPHIQUES)
+    graphique_vers_cache(cle, graph_path)
+
+
+def create_graph_ambulances(ambulances, graph_path=GRAPH_AMBULANCES_PATH):
+    cle = cle_graphique(create_graph_ambulances, ambulances, PALETTE_AMBULANCES, FIGSIZE_BARRES)
+    if graphique_depuis_cache(cle, graph_path):
+        return
+
     total_interventions = sum(ambulances.values())
-    plt.figure()
-    plt.bar(ambulances.keys(), ambulances.values(), color=[
-            '#1D3557', '#457B9D', '#1D3557', '#457B9D', '#1D3557', '#457B9D'], edgecolor='black')
+    fig, ax = nouvelle_figure(FIGSIZE_BARRES)
+    ax.bar(ambulances.keys(), ambulances.values(), color=[
+            PALETTE_AMBULANCES[i % len(PALETTE_AMBULANCES)] for i in range(len(ambulances))], edgecolor='black')
     # print percentage on each bar
     for i, v in enumerate(ambulances.values()):
         pourcentage = (v / total_interventions) * \
             100 if total_interventions > 0 else 0
-        plt.text(i, v + 2, f"{pourcentage:.2f}%", ha='center')
-    plt.title("Répartition interventions par ambulance")
-    plt.ylabel("Nombre d'interventions")
-    plt.tight_layout()
+        ax.text(i, v + 2, f"{pourcentage:.2f}%", ha='center')
+    ax.set_title("Répartition interventions par ambulance")
+    ax.set_ylabel("Nombre d'interventions")
+    fig.tight_layout()
 
-    graph_path = GRAPH_AMBULANCES_PATH
-    plt.savefig(graph_path, dpi=300)
-    plt.close()
+    fig.savefig(graph_path, dpi=DPI_GRAPHIQUES)
+    graphique_vers_cache(cle, graph_path)
 
 
-def repartition_nacas(lecteur):
-    nacas = {"0": 0, "1": 0, "2": 0, "3": 0,
-             "4": 0, "5": 0, "6": 0, "7": 0, "9": 0}
-    next(lecteur, None)  # saute l'en-tête
+class RepartitionNacas(Agregateur):
+    def __init__(self):
+        self.nacas = {naca: 0 for naca in NACAS}
 
-    for ligne in lecteur:
-        naca = ligne[26].strip()
-        if naca:
-            if naca not in nacas:
-                nacas[naca] = 0
-            nacas[naca] += 1
+    def ajouter(self, table):
+        ajouter_comptes(self.nacas, table["naca"], table.categories["naca"])
 
-    total_interventions = sum(nacas.values())
-    # for n, count in nacas.items():
-    #     pourcentage = (count / total_interventions) * 100
-    #     print(f"NACA {n} : {count} interventions ({pourcentage:.2f}%)")
-    return nacas
+    def resultat(self):
+        return self.nacas
 
 
-def create_graph_nacas(nacas):
-    total_interventions = sum(nacas.values())
-    palette_naca = {
-        '0': "#6FCF97",
-        '1': "#27AE60",
-        '2': "#F2C94C",
-        '3': "#F2994A",
-        '4': "#E67E22",
-        '5': "#D62828",
-        '6': "#1D3557",
-        '7': "#000000",
-        '9': "#FFFFFF"
-    }
+def repartition_nacas(lecteur):
+    return calculer_un(lecteur, RepartitionNacas())
+
 
-    plt.figure()
-    plt.bar(nacas.keys(), nacas.values(), color=[
-            palette_naca[k] for k in nacas.keys()], edgecolor='black')
+def create_graph_nacas(nacas, graph_path=GRAPH_NACAS_PATH):
+    cle = cle_graphique(create_graph_nacas, nacas, PALETTE_NACA, FIGSIZE_BARRES)
+    if graphique_depuis_cache(cle, graph_path):
+        return
+
+    total_interventions = sum(nacas.values())
+    fig, ax = nouvelle_figure(FIGSIZE_BARRES)
+    ax.bar(nacas.keys(), nacas.values(), color=[
+            PALETTE_NACA[k] for k in nacas.keys()], edgecolor='black')
     # print percentage on each bar
     for i, v in enumerate(nacas.values()):
         pourcentage = (v / total_interventions) * \
             100 if total_interventions > 0 else 0
-        plt.text(i, v + 2, f"{pourcentage:.2f}%", ha='center')
-    plt.title("Répartition interventions par NACA")
-    plt.ylabel("Nombre d'interventions")
-    plt.xlabel("NACA")
-    plt.tight_layout()
-
-    graph_path = GRAPH_NACAS_PATH
-    plt.savefig(graph_path, dpi=300)
-    plt.close()
-
-
-def create_graph_heures(inter_by_heure):
-    palette_heures = {
-        # Nuit profonde
-        '00': "#0B132B",
-        '01': "#0B132B",
-        '02': "#1C2541",
-        '03': "#1C2541",
-        '04': "#3A506B",
-
-        # Aube
-        '05': "#5BC0BE",
-        '06': "#89C2D9",
-        '07': "#A9D6E5",
-
-        # Matin
-        '08': "#F1FAEE",
-        '09': "#FFE8A1",
-        '10': "#FFD166",
-        '11': "#FFC43D",
-
-        # Midi (maximum activité lumineuse)
-        '12': "#FFB703",
-        '13': "#FFB703",
-        '14': "#FFD166",
-
-        # Après-midi
-        '15': "#F4A261",
-        '16': "#E76F51",
-        '17': "#D62828",
-
-        # Soirée
-        '18': "#BC4749",
-        '19': "#6D597A",
-        '20': "#355070",
-
-        # Nuit
-        '21': "#1D3557",
-        '22': "#1D3557",
-        '23': "#0B132B"
-    }
+        ax.text(i, v + 2, f"{pourcentage:.2f}%", ha='center')
+    ax.set_title("Répartition interventions par NACA")
+    ax.set_ylabel("Nombre d'interventions")
+    ax.set_xlabel("NACA")
+    fig.tight_layout()
+
+    fig.savefig(graph_path, dpi=DPI_GRAPHIQUES)
+    graphique_vers_cache(cle, graph_path)
+
 
-    plt.figure()
-    plt.bar(inter_by_heure.keys(), inter_by_heure.values(), color=[
-            palette_heures[k] for k in inter_by_heure.keys()], edgecolor='black')
-    plt.title("Nombre d'interventions par heure")
-    plt.ylabel("Nombre d'interventions")
-    plt.xlabel("Heure")
-    plt.tight_layout()
+def create_graph_heures(inter_by_heure, graph_path=GRAPH_INTER_BY_HEURE_PATH):
+    cle = cle_graphique(create_graph_heures, inter_by_heure, PALETTE_HEURES, FIGSIZE_BARRES)
+    if graphique_depuis_cache(cle, graph_path):
+        return
 
-    graph_path = GRAPH_INTER_BY_HEURE_PATH
-    plt.savefig(graph_path, dpi=300)
-    plt.close()
+    fig, ax = nouvelle_figure(FIGSIZE_BARRES)
+    ax.bar(inter_by_heure.keys(), inter_by_heure.values(), color=[
+            PALETTE_HEURES[k] for k in inter_by_heure.keys()], edgecolor='black')
+    ax.set_title("Nombre d'interventions par heure")
+    ax.set_ylabel("Nombre d'interventions")
+    ax.set_xlabel("Heure")
+    fig.tight_layout()
+
+    fig.savefig(graph_path, dpi=DPI_GRAPHIQUES)
+    graphique_vers_cache(cle, graph_path)
+
+
+class AgePatients(Agregateur):
+    def __init__(self):
+        # histogramme : nombre de patients par âge
+        self.nb_par_age = np.zeros(0, dtype=np.int64)
+
+    def ajouter(self, table):
+        masque = (table["age"] >= 0) & table["a_date_naissance"]
+        comptes = np.bincount(table["age"][masque])
+        if len(comptes) > len(self.nb_par_age):
+            self.nb_par_age = np.pad(
+                self.nb_par_age, (0, len(comptes) - len(self.nb_par_age)))
+        self.nb_par_age[:len(comptes)] += comptes
+
+    def resultat(self):
+        # {âge: nombre de patients}, par âge croissant
+        return {age: int(nombre) for age, nombre in enumerate(self.nb_par_age.tolist()) if nombre}
 
 
 def get_age_patients(lecteur):
-    ages = []
-    next(lecteur, None)  # saute l'en-tête
+    return calculer_un(lecteur, AgePatients())
+
+
+def resume_ages(ages):
+    # moyenne, médiane, minimum, maximum et nombre de patients d'un histogramme {âge: nombre}
+    valeurs = np.array(sorted(ages), dtype=np.int64)
+    nombres = np.array([ages[age] for age in valeurs.tolist()], dtype=np.int64)
+    nb_patients = int(nombres.sum())
+    cumul = np.cumsum(nombres)
+    # comme np.median : moyenne des deux valeurs du milieu si le nombre est pair
+    milieu = valeurs[np.searchsorted(cumul, [(nb_patients - 1) // 2, nb_patients // 2], side="right")]
+    return {"moyenne": int((valeurs * nombres).sum()) / nb_patients,
+            "mediane": float(milieu.mean()),
+            "min": int(valeurs[0]),
+            "max": int(valeurs[-1]),
+            "nombre": nb_patients}
+
+
+def proportion_nacas_par_personne(nacas_by_personne, nacas_cibles, k=None, support=None, support_min=0):
+    # pour chaque personne : (nombre de NACAs, nombre de NACAs cibles, proportion), les k
+    # premières par proportion (voir classement)
+    output = {}
+    for personne, nacas in nacas_by_personne.items():
+        nb_nacas = sum(nacas.values())
+        nb_nacas_cibles = sum(nombre for naca, nombre in nacas.items() if naca in nacas_cibles)
+        if nb_nacas_cibles > 0:
+            output[personne] = (nb_nacas, nb_nacas_cibles,
+                                nb_nacas_cibles / nb_nacas)
+    return classement(output, k, cle=lambda valeur: valeur[2], support=support, support_min=support_min)
 
-    for ligne in lecteur:
-        age_str = ligne[32].strip()
-        date_de_naissance_str = ligne[31].strip()
-        if age_str.isdigit() and date_de_naissance_str != "":
-            ages.append(int(age_str))
 
-    return ages
+NACAS_HAUTS = ["5", "6", "7"]
+NACAS_BAS = ["0", "1", "9"]
 
 
 def get_nacas_hauts(lecteur):
-    nacas_by_personne = get_naca_by_personne(lecteur)
-    nb_nacas_haut = {}
-    nb_nacas = {}
-    for personne, nacas in nacas_by_personne.items():
-        # print(f"{personne} : {nacas}")
-        for naca in nacas:
-            if naca in ["5", "6", "7"]:
-                if personne not in nb_nacas_haut:
-                    nb_nacas_haut[personne] = 0
-                nb_nacas_haut[personne] += 1
-            if personne not in nb_nacas:
-                nb_nacas[personne] = 0
-            nb_nacas[personne] += 1
-    output = {}
-    for personne in nb_nacas_haut:
-        output[personne] = (nb_nacas[personne], nb_nacas_haut[personne], (
-            nb_nacas_haut[personne] / nb_nacas[personne]) if nb_nacas[personne] > 0 else 0)
-    sorted_output = dict(
-        sorted(output.items(), key=lambda item: item[1][2], reverse=True))
-    return sorted_output
+    return classements_lecteur(lecteur)["nacas_hauts"]
 
 
 def get_nacas_bas(lecteur):
-    nacas_by_personne = get_naca_by_personne(lecteur)
-    nb_nacas_bas = {}
-    nb_nacas = {}
-    for personne, nacas in nacas_by_personne.items():
-        # print(f"{personne} : {nacas}")
-        for naca in nacas:
-            if naca in ["0", "1", "9"]:
-                if personne not in nb_nacas_bas:
-                    nb_nacas_bas[personne] = 0
-                nb_nacas_bas[personne] += 1
-            if personne not in nb_nacas:
-                nb_nacas[personne] = 0
-            nb_nacas[personne] += 1
-    output = {}
-    for personne in nb_nacas_bas:
-        output[personne] = (nb_nacas[personne], nb_nacas_bas[personne], (
-            nb_nacas_bas[personne] / nb_nacas[personne]) if nb_nacas[personne] > 0 else 0)
-    sorted_output = dict(
-        sorted(output.items(), key=lambda item: item[1][2], reverse=True))
-    return sorted_output
+    return classements_lecteur(lecteur)["nacas_bas"]
+
+
+def classements_par_personne(par_personne, k=TAILLE_CLASSEMENTS):
+    """Classements par personne du rapport, tirés du résultat de StatsParPersonne.
+
+    Chaque classement garde les k premières personnes et leurs ex aequo
+    (voir classement). LIMITE_MIN_INTER n'est appliquée qu'ici : hormis le
+    nombre d'interventions, les classements ne retiennent que les personnes
+    ayant au moins LIMITE_MIN_INTER interventions, pour éviter les biais
+    liés à un petit nombre d'interventions.
+    """
+    interventions = {personne: stats["interventions"] for personne, stats in par_personne.items()}
+
+    def classer(valeurs, k=k, **options):
+        return classement(valeurs, k, support=interventions, support_min=LIMITE_MIN_INTER, **options)
+
+    naca_by_personne = {personne: stats["nacas"] for personne, stats in par_personne.items() if stats["nacas"]}
+    # [total, nuit, pourcentage]
+    inter_nuit = {personne: (stats["avec_heure_sur_site"], stats["nuit"], stats["nuit"] / stats["avec_heure_sur_site"])
+                  for personne, stats in par_personne.items() if stats["avec_heure_sur_site"]}
+    age_moyen = {personne: stats["somme_ages"] / stats["nombre_ages"]
+                 for personne, stats in par_personne.items() if stats["nombre_ages"]}
+    return {
+        "naca_by_personne": naca_by_personne,
+        "nacas_bas": proportion_nacas_par_personne(naca_by_personne, NACAS_BAS, k, interventions, LIMITE_MIN_INTER),
+        "nacas_hauts": proportion_nacas_par_personne(naca_by_personne, NACAS_HAUTS, k, interventions, LIMITE_MIN_INTER),
+        "inter_nuit": classer(inter_nuit, cle=lambda valeur: valeur[2]),
+        "nb_inter_by_personne": classement(interventions, k),
+        # les patients les plus âgés en moyenne, et les plus jeunes
+        "age_moyen_by_ambu": {"seniors": classer(age_moyen),
+                              "juniors": classer(age_moyen, plus_petits=True)},
+        # seulement les personnes ayant le plus d'interventions pédiatriques
+        "nb_inter_ped": classer({personne: stats["pediatriques"] for personne, stats in par_personne.items()
+                                 if stats["pediatriques"]}, k=1),
+        "nb_depart_a_midi_by_personne": classer({personne: stats["departs_a_midi"] for personne, stats in par_personne.items()
+                                                 if stats["departs_a_midi"]}),
+    }
+
+
+def classements_lecteur(lecteur):
+    return classements_par_personne(calculer_un(lecteur, StatsParPersonne()))
+
 
+def create_graph_ages(ages, graph_path=GRAPH_AGES_PATH):
+    cle = cle_graphique(create_graph_ages, ages, FIGSIZE_AGES)
+    if graphique_depuis_cache(cle, graph_path):
+        return
+
+    if not ages:
+        # aucun âge renseigné (sous-rapport filtré, par exemple) : figure vide
+        fig, ax = nouvelle_figure(FIGSIZE_AGES)
+        ax.text(0.5, 0.5, "Aucun âge renseigné", ha='center', va='center')
+        ax.set_axis_off()
+        ax.set_title("Distribution des âges")
+        fig.savefig(graph_path, dpi=DPI_GRAPHIQUES)
+        graphique_vers_cache(cle, graph_path)
+        return
 
-def create_graph_ages(ages):
     # Calcul des stats
-    age_moyen = np.mean(ages)
-    age_median = np.median(ages)
-    age_min = np.min(ages)
-    age_max = np.max(ages)
-    nb_patients = len(ages)
-
-    plt.figure(figsize=(6, 4))
-
-    # Violin plot horizontal
-    parts = plt.violinplot(
-        ages,
-        vert=False,
-        showmeans=False,
-        showmedians=False,
-        showextrema=True
-    )
+    resume = resume_ages(ages)
+    age_moyen = resume["moyenne"]
+    age_median = resume["mediane"]
+    age_min = resume["min"]
+    age_max = resume["max"]
+    nb_patients = resume["nombre"]
+
+    fig, ax = nouvelle_figure(FIGSIZE_AGES)
+
+    # Densité estimée directement sur l'histogramme (noyau gaussien, largeur
+    # de Scott comme violinplot), sans recréer la liste de tous les âges ;
+    # il faut au moins deux âges différents pour l'estimer
+    if len(ages) > 1:
+        valeurs = np.array(list(ages), dtype=np.float64)
+        poids = np.array(list(ages.values()), dtype=np.float64)
+        ecart_type = np.sqrt(np.sum(poids * (valeurs - age_moyen) ** 2) / (nb_patients - 1))
+        largeur = ecart_type * nb_patients ** (-1 / 5)
+        coords = np.linspace(age_min, age_max, 100)
+        densite = (poids * np.exp(-0.5 * ((coords[:, None] - valeurs) / largeur) ** 2)).sum(axis=1)
+
+        # Violin plot horizontal
+        parts = ax.violin(
+            [{"coords": coords, "vals": densite, "mean": age_moyen, "median": age_median,
+              "min": age_min, "max": age_max}],
+            orientation="horizontal",
+            showmeans=False,
+            showmedians=False,
+            showextrema=True
+        )
 
     # Ligne médiane
-    plt.axvline(age_median, linestyle='-', linewidth=2,
-                label=f"Age médian: {age_median:.1f}")
+    ax.axvline(age_median, linestyle='-', linewidth=2,
+               label=f"Age médian: {age_median:.1f}")
 
     # Ligne moyenne
-    plt.axvline(age_moyen, linestyle='--', linewidth=2,
-                label=f"Age moyen: {age_moyen:.1f}")
+    ax.axvline(age_moyen, linestyle='--', linewidth=2,
+               label=f"Age moyen: {age_moyen:.1f}")
 
     # Lignes min et max
-    plt.axvline(age_min, linestyle=' ', label=f"Age minimum: {age_min}")
-    plt.axvline(age_max, linestyle=' ', label=f"Age maximum: {age_max}")
-    plt.axvline(0, linestyle=' ', label=f"Nombre de patients: {nb_patients}")
+    ax.axvline(age_min, linestyle=' ', label=f"Age minimum: {age_min}")
+    ax.axvline(age_max, linestyle=' ', label=f"Age maximum: {age_max}")
+    ax.axvline(0, linestyle=' ', label=f"Nombre de patients: {nb_patients}")
 
-    plt.yticks([])  # enlève l'axe Y inutile
-    plt.xlabel("Âge")
-    plt.title("Distribution des âges")
+    ax.set_yticks([])  # enlève l'axe Y inutile
+    ax.set_xlabel("Âge")
+    ax.set_title("Distribution des âges")
 
-    plt.legend(loc='upper left')
-    plt.tight_layout()
+    ax.legend(loc='upper left')
+    fig.tight_layout()
 
-    plt.savefig(GRAPH_AGES_PATH, dpi=300)
-    plt.close()
+    fig.savefig(graph_path, dpi=DPI_GRAPHIQUES)
+    graphique_vers_cache(cle, graph_path)
 
 
-def get_nb_inter_by_heure(lecteur):
-    nb_inter_by_heure = {str(h).zfill(2): 0 for h in range(24)}
-    next(lecteur, None)  # saute l'en-tête
+class InterventionsParHeure(Agregateur):
+    def __init__(self):
+        self.nb_inter_by_heure = {str(h).zfill(2): 0 for h in range(24)}
 
-    for ligne in lecteur:
-        horaire_str = ligne[15].strip()
-        if re.match(r'^\d{2}:\d{2}$', horaire_str):
-            heure = horaire_str.split(":")[0]
-            nb_inter_by_heure[heure] += 1
+    def ajouter(self, table):
+        sur_site = table["sur_site"]
+        heures = np.bincount(sur_site[sur_site >= 0] // 60, minlength=24)
+        for heure, nombre in enumerate(heures.tolist()):
+            self.nb_inter_by_heure[str(heure).zfill(2)] += nombre
 
-    return nb_inter_by_heure
+    def resultat(self):
+        return self.nb_inter_by_heure
 
 
-def get_nb_inter_nuit_par_personne(lecteur):
-    nb_inter_nuit_par_personne = {}
-    next(lecteur, None)  # saute l'en-tête
-
-    for ligne in lecteur:
-        leader = ligne[7].strip()
-        equipier = ligne[8].strip()
-        horaire_str = ligne[15].strip()
-
-        if re.match(r'^\d{2}:\d{2}$', horaire_str):
-            heure = int(horaire_str.split(":")[0])
-            if leader:
-                if leader not in nb_inter_nuit_par_personne:
-                    nb_inter_nuit_par_personne[leader] = (
-                        0, 0, 0)  # [total, nuit, pourcentage]
-                if heure >= 2 and heure < 6:  # on considère la nuit de 2h à 6h
-                    nb_inter_nuit_par_personne[leader] = (
-                        nb_inter_nuit_par_personne[leader][0] + 1, nb_inter_nuit_par_personne[leader][1] + 1, 0)
-                else:
-                    nb_inter_nuit_par_personne[leader] = (
-                        nb_inter_nuit_par_personne[leader][0] + 1, nb_inter_nuit_par_personne[leader][1], 0)
-
-            if equipier:
-                if equipier not in nb_inter_nuit_par_personne:
-                    nb_inter_nuit_par_personne[equipier] = (
-                        0, 0, 0)  # [total, nuit, pourcentage]
-                if heure >= 2 and heure < 6:  # on considère la nuit de 2h à 6h
-                    nb_inter_nuit_par_personne[equipier] = (
-                        nb_inter_nuit_par_personne[equipier][0] + 1, nb_inter_nuit_par_personne[equipier][1] + 1, 0)
-                else:
-                    nb_inter_nuit_par_personne[equipier] = (
-                        nb_inter_nuit_par_personne[equipier][0] + 1, nb_inter_nuit_par_personne[equipier][1], 0)
+def get_nb_inter_by_heure(lecteur):
+    return calculer_un(lecteur, InterventionsParHeure())
 
-    for personne in nb_inter_nuit_par_personne:
-        nb_total = nb_inter_nuit_par_personne[personne][0]
-        nb_nuit = nb_inter_nuit_par_personne[personne][1]
-        pourcentage = (nb_nuit / nb_total) if nb_total > 0 else 0
-        nb_inter_nuit_par_personne[personne] = (
-            nb_total, nb_nuit, pourcentage)
 
-    sorted_nb_inter_nuit_par_personne = dict(
-        sorted(nb_inter_nuit_par_personne.items(), key=lambda item: item[1][2], reverse=True))
-    return sorted_nb_inter_nuit_par_personne
+def get_nb_inter_nuit_par_personne(lecteur):
+    return classements_lecteur(lecteur)["inter_nuit"]
 
 
 def get_most_interventions_by_personne(lecteur):
-    nb_inter_by_personne = {}
-    next(lecteur, None)  # saute l'en-tête
-
-    for ligne in lecteur:
-        leader = ligne[7].strip()
-        # Supprimer les double espaces éventuels
-        leader = re.sub(' +', ' ', leader)
-
-        equipier = ligne[8].strip()
-        # Supprimer les double espaces éventuels
-        equipier = re.sub(' +', ' ', equipier)
-
-        if leader:
-            if leader not in nb_inter_by_personne:
-                nb_inter_by_personne[leader] = 0
-            nb_inter_by_personne[leader] += 1
+    return classements_lecteur(lecteur)["nb_inter_by_personne"]
+
+
+class MatriceBinomes(Agregateur):
+    """Nombre d'interventions faites ensemble par chaque paire de personnes.
+
+    Matrice creuse et symétrique : seules les paires qui ont travaillé
+    ensemble y figurent, dans les deux sens. Toutes les paires d'une ligne
+    comptent (leader, équipier et troisième) ; les matrices de plusieurs mois
+    s'additionnent case par case (voir Agregateur.fusionner).
+    """
+
+    def __init__(self):
+        # personne -> {partenaire: nombre d'interventions ensemble}
+        self.partenaires = {}
+
+    def ajouter(self, table):
+        colonnes = [table[colonne] for colonne in COLONNES_PERSONNES.values()]
+        leaders, equipiers, troisiemes = colonnes
+        # chaque paire de personnes distinctes d'une ligne n'est comptée qu'une fois
+        troisieme_distinct = (troisiemes != leaders) & (troisiemes != equipiers)
+        premiers = np.stack([leaders, leaders, equipiers], axis=1).ravel()
+        seconds = np.stack([equipiers, troisiemes, troisiemes], axis=1).ravel()
+        distinctes = np.stack([leaders != equipiers, troisieme_distinct,
+                               troisieme_distinct & (equipiers != leaders)], axis=1).ravel()
+        masque = distinctes & (premiers >= 0) & (seconds >= 0)
+        premiers, seconds = premiers[masque], seconds[masque]
+
+        # une paire = un code (plus petit identifiant, plus grand identifiant)
+        nb_personnes = len(table.categories["personne"])
+        codes = (np.minimum(premiers, seconds).astype(np.int64) * nb_personnes
+                 + np.maximum(premiers, seconds))
+        uniques, indices = grouper(codes)
+        comptes = np.bincount(indices, minlength=len(uniques))
+        for code, nombre in zip(uniques.tolist(), comptes.tolist()):
+            personne, partenaire = (table.personne(identifiant) for identifiant in divmod(code, nb_personnes))
+            for a, b in ((personne, partenaire), (partenaire, personne)):
+                voisins = self.partenaires.setdefault(a, {})
+                voisins[b] = voisins.get(b, 0) + nombre
+
+    def resultat(self):
+        return self.partenaires
+
+
+def classements_binomes(partenaires, k=TAILLE_CLASSEMENTS):
+    """Classements tirés de la matrice de MatriceBinomes, en O(nombre de paires).
+
+    "nb_inter_by_binome" : les k binômes les plus fréquents ("A. B. et C. D.")
+    et leurs ex aequo ; "partenaire_favori" : pour chaque personne, son
+    partenaire le plus fréquent et le nombre d'interventions ensemble.
+    """
+    binomes = {}
+    for personne, voisins in partenaires.items():
+        for partenaire, nombre in voisins.items():
+            # chaque paire apparaît deux fois dans la matrice, on n'en garde qu'une
+            if personne < partenaire:
+                binome = " et ".join(sorted([abreger_nom(personne), abreger_nom(partenaire)]))
+                binomes[binome] = binomes.get(binome, 0) + nombre
+    return {
+        "nb_inter_by_binome": classement(binomes, k),
+        "partenaire_favori": {personne: max(voisins.items(), key=lambda item: item[1])
+                              for personne, voisins in partenaires.items()},
+    }
 
-        if equipier:
-            if equipier not in nb_inter_by_personne:
-                nb_inter_by_personne[equipier] = 0
-            nb_inter_by_personne[equipier] += 1
 
-    sorted_nb_inter_by_personne = dict(
-        sorted(nb_inter_by_personne.items(), key=lambda item: item[1], reverse=True))
-    return sorted_nb_inter_by_personne
+def get_most_interventions_by_binome(lecteur):
+    return classements_binomes(calculer_un(lecteur, MatriceBinomes()))["nb_inter_by_binome"]
+
+
+class AvcLePlusRapide(Agregateur):
+    def __init__(self):
+        # on initialise le temps minimum à l'infini pour pouvoir le comparer avec les temps calculés
+        self.temps_min = float('inf')
+        self.leader_min = None
+        self.equipier_min = None
+        self.date_min = None
+
+    def ajouter(self, table):
+        # AVC (motif 1105) de degré 1 amenés à l'hôpital
+        durees, valide = durees_entre(table, "alarme", "hopital")
+        masque = valide & np.isin(table["motif_est"], table.codes(
+            "motif_est", lambda m: m[:4] == "1105"))
+        masque &= np.isin(table["degre_est"],
+                          table.codes("degre_est", lambda d: d == "1"))
+        lignes = np.flatnonzero(masque)
+        if len(lignes) == 0:
+            return
+
+        duree = durees[lignes]
+        i = lignes[np.argmin(duree)]
+        temps_inter = int(duree.min()) / 60
+        if temps_inter < self.temps_min:
+            self.temps_min = temps_inter
+            self.leader_min = table.personne(table["leader"][i])
+            self.equipier_min = table.personne(table["equipier"][i])
+            self.date_min = str(table["date"][i])
+
+    def fusionner(self, autre):
+        # à égalité, on garde l'intervention du premier mois
+        if autre.temps_min < self.temps_min:
+            vars(self).update(vars(autre))
+
+    def resultat(self):
+        return (self.temps_min, self.leader_min, self.equipier_min, self.date_min)
 
 
-def get_most_interventions_by_binome(lecteur):
-    nb_inter_by_binome = {}
-    next(lecteur, None)  # saute l'en-tête
+def get_fastest_avc(lecteur):
+    return calculer_un(lecteur, AvcLePlusRapide())
+
+
+class InterventionLaPlusLongue(Agregateur):
+    def __init__(self):
+        # on initialise le temps maximum à 0 pour pouvoir le comparer avec les temps calculés
+        self.temps_max = 0
+        self.leader_max = None
+        self.equipier_max = None
+        self.date_max = None
+
+    def ajouter(self, table):
+        # si la colonne Hopital est vide, on ignore la ligne
+        durees, valide = durees_entre(table, "sur_site", "quebec")
+        lignes = np.flatnonzero(valide & (table["hopital"] >= 0))
+        duree = durees[lignes]
+        # on ignore les interventions de plus de 10h qui sont probablement des erreurs de saisie
+        lignes, duree = lignes[duree <= 10 * 60], duree[duree <= 10 * 60]
+        if len(lignes) == 0:
+            return
+
+        i = lignes[np.argmax(duree)]
+        temps_inter = int(duree.max()) / 60
+        if temps_inter > self.temps_max:
+            self.temps_max = temps_inter
+            self.leader_max = table.personne(table["leader"][i])
+            self.equipier_max = table.personne(table["equipier"][i])
+            self.date_max = str(table["date"][i])
+
+    def fusionner(self, autre):
+        # à égalité, on garde l'intervention du premier mois
+        if autre.temps_max > self.temps_max:
+            vars(self).update(vars(autre))
+
+    def resultat(self):
+        return (self.temps_max, self.leader_max, self.equipier_max, self.date_max)
 
-    for ligne in lecteur:
-        leader_raw = ligne[7].strip()
 
-        # Supprimer les double espaces éventuels
-        leader_raw = re.sub(' +', ' ', leader_raw)
+def get_longest_inter(lecteur):
+    return calculer_un(lecteur, InterventionLaPlusLongue())
 
-        leader = leader_raw.split(" ")[0] + " " + \
-            leader_raw.split(" ")[1][0] + "."
-        equipier_raw = ligne[8].strip()
 
-        # Supprimer les double espaces éventuels
-        equipier_raw = re.sub(' +', ' ', equipier_raw)
+def get_patient_age_moyen_by_ambulancier(lecteur):
+    return classements_lecteur(lecteur)["age_moyen_by_ambu"]
 
-        equipier = equipier_raw.split(" ")[0] + " " + \
-            equipier_raw.split(" ")[1][0] + "."
 
-        if leader and equipier:
-            if leader < equipier:
-                binome = f"{leader} et {equipier}"
-            else:
-                binome = f"{equipier} et {leader}"
-            if binome not in nb_inter_by_binome:
-                nb_inter_by_binome[binome] = 0
-            nb_inter_by_binome[binome] += 1
+def get_nbmax_inter_ped(lecteur):
+    return classements_lecteur(lecteur)["nb_inter_ped"]
 
-    sorted_nb_inter_by_binome = dict(
-        sorted(nb_inter_by_binome.items(), key=lambda item: item[1], reverse=True))
-    return sorted_nb_inter_by_binome
 
+def get_max_depart_a_midi(lecteur):
+    return classements_lecteur(lecteur)["nb_depart_a_midi_by_personne"]
+
+
+# Agrégateurs calculés par main() lors de l'unique lecture du fichier
+AGREGATEURS = {
+    "nb_interventions": NombreInterventions,
+    "priorites": RepartitionPriorites,
+    "ambulances": RepartitionAmbulances,
+    "nacas": RepartitionNacas,
+    "ages": AgePatients,
+    "inter_by_heure": InterventionsParHeure,
+    "temps_sur_site": TempsSurSite,
+    "quantiles_durees": QuantilesDurees,
+    "motifs_EST": RepartitionMotifEst,
+    "par_personne": StatsParPersonne,
+    "nacas_p3": NacaDesP3,
+    "binomes": MatriceBinomes,
+    "occupation": OccupationFlotte,
+    "fastest_avc": AvcLePlusRapide,
+    "longest_inter": InterventionLaPlusLongue,
+}
+
+
+def creer_agregateurs():
+    return {nom: classe() for nom, classe in AGREGATEURS.items()}
+
+
+# fonction get_* (ou repartition_*) -> clé de son résultat dans
+# resultats_agregateurs (agrégateur ou classement qui en est tiré) ; le
+# service répond aussi sous le nom de la fonction
+CLES_FONCTIONS = {
+    "get_temps_sur_site": "temps_sur_site",
+    "get_quantiles_durees": "quantiles_durees",
+    "get_naca_by_personne": "naca_by_personne",
+    "get_naca_of_p3": "nacas_p3",
+    "repartition_motif_est": "motifs_EST",
+    "repartition_priorites": "priorites",
+    "repartition_ambulances": "ambulances",
+    "get_occupation_flotte": "occupation",
+    "repartition_nacas": "nacas",
+    "get_age_patients": "ages",
+    "get_nacas_hauts": "nacas_hauts",
+    "get_nacas_bas": "nacas_bas",
+    "get_nb_inter_by_heure": "inter_by_heure",
+    "get_nb_inter_nuit_par_personne": "inter_nuit",
+    "get_most_interventions_by_personne": "nb_inter_by_personne",
+    "get_most_interventions_by_binome": "nb_inter_by_binome",
+    "get_fastest_avc": "fastest_avc",
+    "get_longest_inter": "longest_inter",
+    "get_patient_age_moyen_by_ambulancier": "age_moyen_by_ambu",
+    "get_nbmax_inter_ped": "nb_inter_ped",
+    "get_max_depart_a_midi": "nb_depart_a_midi_by_personne",
+}
+
+
+# L'état des agrégateurs est enregistré entre deux exécutions (mode
+# incrémental, résumés mensuels) : à incrémenter quand il change
+VERSION_AGREGATEURS = 10
+
+
+def ecrire_etat(chemin, etat):
+    # écriture puis renommage, comme pour le cache des tables
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    temporaire = f"{chemin}.{os.getpid()}.tmp"
+    with open(temporaire, "wb") as fichier:
+        pickle.dump(etat, fichier)
+    os.replace(temporaire, chemin)
+
+
+def etat_agregateurs(agregateurs):
+    return {nom: vars(agregateur) for nom, agregateur in agregateurs.items()}
+
+
+def agregateurs_depuis_etat(etats):
+    agregateurs = creer_agregateurs()
+    for nom, agregateur in agregateurs.items():
+        vars(agregateur).update(copy.deepcopy(etats[nom]))
+    return agregateurs
+
+
+# ====== MODE INCRÉMENTAL =====
+# Pendant le mois, le même export est ré-exporté avec de nouvelles lignes à la
+# fin. On garde entre deux exécutions la position (en octets) de la fin de la
+# dernière ligne lue, le hash de tout ce qui précède et l'état des agrégateurs :
+# seule la suite du fichier est lue. Si le début du fichier a changé, tout est
+# recalculé.
+INCREMENTAL_DIR = "cache/incremental"
+
+
+def lire_etat_incremental(chemin_etat):
+    try:
+        with open(chemin_etat, "rb") as fichier:
+            etat = pickle.load(fichier)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return None
+    if etat.get("version") != VERSION_AGREGATEURS or set(etat["agregateurs"]) != set(AGREGATEURS):
+        return None
+    return etat
+
+
+def table_depuis_octets(octets, en_tete):
+    texte = io.StringIO(bytes(octets).decode("utf-8"), newline="")
+    return charger_table(csv.reader(texte, delimiter=";"), en_tete=en_tete)
+
+
+def calculer_incremental(chemin_fichier):
+    """Tous les agrégateurs du fichier en ne lisant que la fin qui y a été ajoutée.
+
+    Retourne (agregateurs, heures_invalides, nombre de lignes lues).
+    """
+    cle = hashlib.sha256(os.path.abspath(chemin_fichier).encode()).hexdigest()
+    chemin_etat = f"{INCREMENTAL_DIR}/{cle[:32]}.pickle"
+    with open(chemin_fichier, "rb") as fichier:
+        contenu = memoryview(fichier.read())
+
+    etat = lire_etat_incremental(chemin_etat)
+    if etat is not None and (etat["position"] > len(contenu) or
+                             hashlib.sha256(contenu[:etat["position"]]).hexdigest() != etat["hash_debut"]):
+        print("Le début du fichier a changé depuis la dernière exécution, tout est recalculé.")
+        etat = None
+    if etat is None:
+        etat = {"version": VERSION_AGREGATEURS, "position": 0,
+                "hash_debut": hashlib.sha256(b"").hexdigest(),
+                "agregateurs": etat_agregateurs(creer_agregateurs()),
+                "heures_invalides": {}}
+
+    # seules les lignes complètes sont ajoutées à l'état : une dernière ligne
+    # sans retour à la ligne (ou dont une cellule entre guillemets n'est pas
+    # refermée) est peut-être en cours d'écriture
+    debut = etat["position"]
+    reste = bytes(contenu[debut:])
+    fin = guillemets = 0
+    while True:
+        position, guillemets = fin_enregistrement(reste, fin, guillemets)
+        if position < 0:
+            break
+        fin = position
+    fin += debut
+    agregateurs = agregateurs_depuis_etat(etat["agregateurs"])
+    heures_invalides = dict(etat["heures_invalides"])
+    nb_lignes = 0
+    if fin > debut:
+        table = table_depuis_octets(contenu[debut:fin], en_tete=(debut == 0))
+        calculer_table(table, agregateurs)
+        for colonne, nombre in table.heures_invalides.items():
+            heures_invalides[colonne] = heures_invalides.get(colonne, 0) + nombre
+        nb_lignes = len(table)
+    ecrire_etat(chemin_etat, {"version": VERSION_AGREGATEURS, "position": fin,
+                              "hash_debut": hashlib.sha256(contenu[:fin]).hexdigest(),
+                              "agregateurs": etat_agregateurs(agregateurs),
+                              "heures_invalides": heures_invalides})
+
+    # la dernière ligne incomplète compte pour ce rapport, sans être gardée
+    if bytes(contenu[fin:]).strip():
+        agregateurs = agregateurs_depuis_etat(etat_agregateurs(agregateurs))
+        table = table_depuis_octets(contenu[fin:], en_tete=(fin == 0))
+        calculer_table(table, agregateurs)
+        nb_lignes += len(table)
+
+    return agregateurs, heures_invalides, nb_lignes
+
+
+# ====== LECTURE PARALLÈLE =====
+# Un gros export (plusieurs années) est découpé en morceaux d'environ
+# TAILLE_MORCEAU octets, coupés entre deux lignes. Chaque morceau est lu dans
+# un processus séparé, qui ouvre lui-même le fichier en mmap : seules les
+# positions des morceaux et les résultats passent d'un processus à l'autre.
+TAILLE_MORCEAU = 8 * 1024 * 1024  # environ 50 000 lignes, comme TAILLE_BLOC
+
+
+def fin_enregistrement(contenu, position, guillemets=0):
+    """Fin du premier enregistrement CSV qui se termine après `position`.
+
+    Un retour à la ligne entre guillemets fait partie d'une cellule : un
+    enregistrement ne se termine qu'à un retour à la ligne précédé d'un
+    nombre pair de guillemets, `guillemets` étant le nombre de guillemets
+    déjà comptés avant `position`. Retourne (position juste après ce retour
+    à la ligne, guillemets comptés avant elle), position valant -1 si le
+    contenu ne contient plus de fin d'enregistrement.
+    """
+    while True:
+        fin_ligne = contenu.find(b"\n", position)
+        if fin_ligne < 0:
+            return -1, guillemets
+        guillemets += contenu[position:fin_ligne].count(b'"')
+        position = fin_ligne + 1
+        if guillemets % 2 == 0:
+            return position, guillemets
+
+
+def limites_morceaux(contenu, taille_morceau=TAILLE_MORCEAU):
+    """Positions (debut, fin) en octets des morceaux de `contenu`.
+
+    Un morceau ne se termine qu'à une fin d'enregistrement (voir
+    fin_enregistrement) : un retour à la ligne entre guillemets fait partie
+    d'une cellule.
+    """
+    limites = [0]
+    position = guillemets = 0  # guillemets comptés avant position
+    while len(contenu) - limites[-1] > taille_morceau:
+        cible = limites[-1] + taille_morceau
+        guillemets += contenu[position:cible].count(b'"')
+        position, guillemets = fin_enregistrement(contenu, cible, guillemets)
+        if position < 0 or position >= len(contenu):
+            break
+        limites.append(position)
+    limites.append(len(contenu))
+    return list(zip(limites, limites[1:]))
+
+
+def decouper_fichier(chemin_fichier, taille_morceau=TAILLE_MORCEAU):
+    if os.path.getsize(chemin_fichier) == 0:
+        return [(0, 0)]
+    with open(chemin_fichier, "rb") as fichier, \
+            mmap.mmap(fichier.fileno(), 0, access=mmap.ACCESS_READ) as contenu:
+        return limites_morceaux(contenu, taille_morceau)
+
+
+def nombre_processus(nb_morceaux):
+    # un processus par morceau, au plus un par cœur ; pas de sous-processus
+    # depuis un processus de travail (rapports de --tous, graphiques, bench)
+    import multiprocessing
+    if multiprocessing.parent_process() is not None:
+        return 1
+    return min(os.cpu_count() or 1, nb_morceaux)
+
+
+def lire_morceau(chemin_fichier, debut, fin):
+    # table des lignes du morceau, l'en-tête sauté pour le premier
+    if fin == debut:
+        return charger_table([], en_tete=False)
+    with open(chemin_fichier, "rb") as fichier, \
+            mmap.mmap(fichier.fileno(), 0, access=mmap.ACCESS_READ) as contenu:
+        octets = contenu[debut:fin]
+    return table_depuis_octets(octets, en_tete=(debut == 0))
+
+
+def agreger_morceau(chemin_fichier, debut, fin):
+    # agrégateurs et heures illisibles du morceau
+    table = lire_morceau(chemin_fichier, debut, fin)
+    agregateurs = creer_agregateurs()
+    calculer_table(table, agregateurs)
+    return agregateurs, table.heures_invalides
+
+
+def concatener_tables(tables):
+    """Une seule table à partir des tables de morceaux consécutifs.
+
+    Les libellés de chaque catégorie (et les noms de personnes) sont mis
+    bout à bout dans l'ordre de première apparition, les codes de chaque
+    table sont renumérotés en conséquence : le résultat est la table qu'aurait
+    donnée la lecture du fichier en une fois.
+    """
+    if len(tables) == 1:
+        return tables[0]
+    categories = {nom: [] for nom in tables[0].categories}
+    # colonne -> catégorie de ses codes
+    colonnes_codees = {nom: nom for nom in categories if nom != "personne"}
+    colonnes_codees.update({nom: "personne" for nom in COLONNES_PERSONNES.values()})
+    morceaux = {nom: [] for nom in tables[0].colonnes}
+    heures_invalides = {}
+    for table in tables:
+        renumerotations = {}
+        for nom, libelles in table.categories.items():
+            index = {libelle: code for code, libelle in enumerate(categories[nom])}
+            for libelle in libelles:
+                if libelle not in index:
+                    index[libelle] = len(categories[nom])
+                    categories[nom].append(libelle)
+            # le dernier élément renumérote les cellules vides (-1) en -1
+            renumerotations[nom] = np.array([index[libelle] for libelle in libelles] + [-1], dtype=np.int16)
+        for nom, valeurs in table.colonnes.items():
+            if nom in colonnes_codees:
+                valeurs = renumerotations[colonnes_codees[nom]][valeurs]
+            morceaux[nom].append(valeurs)
+        for colonne, nombre in table.heures_invalides.items():
+            heures_invalides[colonne] = heures_invalides.get(colonne, 0) + nombre
+    colonnes = {nom: np.concatenate(valeurs) for nom, valeurs in morceaux.items()}
+    return TableInterventions(colonnes, categories, heures_invalides)
+
+
+def charger_table_parallele(chemin_fichier):
+    """Table d'un export, ses morceaux lus en parallèle puis mis bout à bout.
+
+    Un export d'un seul morceau (ou une machine à un cœur) est lu
+    directement, sans processus.
+    """
+    morceaux = decouper_fichier(chemin_fichier)
+    nb_processus = nombre_processus(len(morceaux))
+    if nb_processus <= 1:
+        with open(chemin_fichier, newline="", encoding="utf-8") as csvfile:
+            return charger_table(csv.reader(csvfile, delimiter=";"))
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=nb_processus) as executeur:
+        tables = list(executeur.map(lire_morceau, repeat(chemin_fichier), *zip(*morceaux)))
+    return concatener_tables(tables)
+
+
+def calculer_parallele(chemin_fichier, agregateurs, heures_invalides):
+    """Agrège chaque morceau de l'export dans son processus, sans table complète.
+
+    Seuls les états des agrégateurs reviennent au processus principal, qui
+    les fusionne dans l'ordre du fichier (égalités des min/max). Comme
+    calculer(), la mémoire utilisée ne dépend pas de la longueur de l'export.
+    """
+    morceaux = decouper_fichier(chemin_fichier)
+    nb_processus = nombre_processus(len(morceaux))
+    if nb_processus <= 1:
+        with open(chemin_fichier, newline="", encoding="utf-8") as csvfile:
+            calculer(csv.reader(csvfile, delimiter=";"), agregateurs, heures_invalides)
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=nb_processus) as executeur:
+        for agregateurs_morceau, heures_morceau in executeur.map(
+                agreger_morceau, repeat(chemin_fichier), *zip(*morceaux)):
+            for nom, agregateur in agregateurs.items():
+                agregateur.fusionner(agregateurs_morceau[nom])
+            for colonne, nombre in heures_morceau.items():
+                heures_invalides[colonne] = heures_invalides.get(colonne, 0) + nombre
+
+
+# ====== RÉSUMÉS MENSUELS =====
+# Après chaque rapport, l'état des agrégateurs du mois (compteurs, sommes,
+# histogrammes, min/max avec leur intervention) est enregistré dans
+# RESUMES_DIR. Un rapport annuel ou depuis le début de l'année fusionne ces
+# résumés sans relire aucun export.
+RESUMES_DIR = f"{OUTPUT_DIR}/resumes"
+
+
+def chemin_resume(mois, annee):
+    # "2025-12.pickle" : les résumés sont triés par ordre chronologique
+    return f"{RESUMES_DIR}/{annee}-{NOMS_MOIS.index(mois) + 1:02d}.pickle"
+
+
+def enregistrer_resume(agregateurs, mois, annee):
+    ecrire_etat(chemin_resume(mois, annee), {"version": VERSION_AGREGATEURS,
+                                             "mois": mois, "annee": annee,
+                                             "agregateurs": etat_agregateurs(agregateurs)})
+
+
+def lire_resume(mois, annee):
+    # agrégateurs d'un mois, None si son résumé manque ou est d'une ancienne version
+    try:
+        with open(chemin_resume(mois, annee), "rb") as fichier:
+            resume = pickle.load(fichier)
+    except (FileNotFoundError, pickle.UnpicklingError, EOFError):
+        return None
+    if resume.get("version") != VERSION_AGREGATEURS or set(resume["agregateurs"]) != set(AGREGATEURS):
+        return None
+    return agregateurs_depuis_etat(resume["agregateurs"])
+
+
+def fusionner_resumes(resumes):
+    # les résumés doivent être donnés dans l'ordre chronologique (égalités des min/max)
+    fusion = creer_agregateurs()
+    for resume in resumes:
+        for nom, agregateur in fusion.items():
+            agregateur.fusionner(resume[nom])
+    return fusion
+
+
+# ====== BASE SQLITE =====
+# Chaque export peut être chargé dans une base SQLite locale (--base) : une
+# ligne par intervention, les heures en minutes et les instants de chaque
+# phase (voir horodatages_phases), plus une ligne par membre d'équipage.
+# Les colonnes interrogées (date, priorité, ambulance, NACA, motif EST,
+# personne) sont indexées : les fonctions sql_* donnent les mêmes résultats
+# que les get_* sur n'importe quelle période sans relire aucun export.
+BASE_PATH = f"{OUTPUT_DIR}/interventions.sqlite"
+VERSION_BASE = 1  # à incrémenter quand le schéma change : la base est alors recréée
+
+SCHEMA_BASE = f"""
+CREATE TABLE IF NOT EXISTS fichiers (
+    chemin TEXT PRIMARY KEY,
+    hash TEXT NOT NULL,
+    nb_lignes INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS interventions (
+    id INTEGER PRIMARY KEY,
+    fichier TEXT NOT NULL REFERENCES fichiers (chemin),
+    date TEXT,
+    date_export TEXT NOT NULL,
+    fip TEXT NOT NULL,
+    priorite TEXT,
+    ambulance TEXT,
+    naca TEXT,
+    motif_est TEXT,
+    degre_est TEXT,
+    a_date_naissance INTEGER NOT NULL,
+    age INTEGER,
+    {", ".join(f"{phase} INTEGER, instant_{phase} INTEGER" for phase in PHASES)}
+);
+CREATE TABLE IF NOT EXISTS equipage (
+    intervention INTEGER NOT NULL REFERENCES interventions (id),
+    role TEXT NOT NULL,
+    personne TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS interventions_fichier ON interventions (fichier);
+CREATE INDEX IF NOT EXISTS interventions_date ON interventions (date);
+CREATE INDEX IF NOT EXISTS interventions_priorite ON interventions (priorite);
+CREATE INDEX IF NOT EXISTS interventions_ambulance ON interventions (ambulance);
+CREATE INDEX IF NOT EXISTS interventions_naca ON interventions (naca);
+CREATE INDEX IF NOT EXISTS interventions_motif_est ON interventions (motif_est);
+CREATE INDEX IF NOT EXISTS equipage_personne ON equipage (personne, role);
+CREATE INDEX IF NOT EXISTS equipage_intervention ON equipage (intervention, role, personne);
+"""
+
+
+def ouvrir_base(chemin_base=BASE_PATH):
+    # connexion à la base, créée (ou recréée si son schéma est d'une ancienne version) au besoin
+    import sqlite3
+    os.makedirs(os.path.dirname(chemin_base) or ".", exist_ok=True)
+    connexion = sqlite3.connect(chemin_base)
+    version = connexion.execute("PRAGMA user_version").fetchone()[0]
+    if version != VERSION_BASE:
+        with connexion:
+            for table in ("equipage", "interventions", "fichiers"):
+                connexion.execute(f"DROP TABLE IF EXISTS {table}")
+            connexion.executescript(SCHEMA_BASE)
+            connexion.execute(f"PRAGMA user_version = {VERSION_BASE}")
+    return connexion
+
+
+def dates_iso(dates):
+    # "jj.mm.aaaa" -> "aaaa-mm-jj", None si la date est illisible
+    uniques, indices = grouper(jours_depuis_dates(dates))
+    iso = [datetime.fromordinal(jour).date().isoformat() if jour >= 0 else None
+           for jour in uniques.tolist()]
+    return [iso[indice] for indice in indices.tolist()]
+
+
+def lignes_base(table, premier_id):
+    # lignes des tables interventions et equipage d'une table d'interventions
+    def libelles(colonne):
+        noms = table.categories[colonne]
+        return [noms[code] if code >= 0 else None for code in table[colonne].tolist()]
+
+    def entiers(valeurs):
+        return [valeur if valeur >= 0 else None for valeur in valeurs.tolist()]
+
+    horodatages = table.horodatages()
+    colonnes = [dates_iso(table["date"]), table["date"].tolist(), table["fip"].tolist(),
+                libelles("priorite"), libelles("ambulance"), libelles("naca"),
+                libelles("motif_est"), libelles("degre_est"),
+                table["a_date_naissance"].astype(int).tolist(), entiers(table["age"])]
+    for phase in PHASES:
+        colonnes += [entiers(table[phase]), entiers(horodatages[phase])]
+    ids = range(premier_id, premier_id + len(table))
+    interventions = list(zip(ids, *colonnes))
+    # membres de l'équipage dans l'ordre des lignes : leader0, equipier0, troisieme0, leader1...
+    equipage = [(identifiant, role, table.personne(personne))
+                for identifiant, *personnes in zip(ids, *(table[role].tolist() for role in COLONNES_PERSONNES.values()))
+                for role, personne in zip(COLONNES_PERSONNES.values(), personnes) if personne >= 0]
+    return interventions, equipage
+
+
+def charger_dans_base(chemins_fichiers, chemin_base=BASE_PATH):
+    """Charge des exports CSV dans la base SQLite.
+
+    Un export déjà chargé dont le contenu n'a pas changé (même hash) est
+    ignoré ; s'il a changé, ses anciennes lignes sont remplacées. Chaque
+    export est chargé dans sa propre transaction : relancer le chargement
+    n'ajoute jamais de doublons.
+    """
+    connexion = ouvrir_base(chemin_base)
+    colonnes = ["id", "fichier", "date", "date_export", "fip", "priorite", "ambulance", "naca",
+                "motif_est", "degre_est", "a_date_naissance", "age"]
+    colonnes += [nom for phase in PHASES for nom in (phase, f"instant_{phase}")]
+    try:
+        for chemin_fichier in chemins_fichiers:
+            cle = os.path.abspath(chemin_fichier)
+            empreinte = hash_fichier(chemin_fichier)
+            deja_charge = connexion.execute("SELECT hash FROM fichiers WHERE chemin = ?", (cle,)).fetchone()
+            if deja_charge is not None and deja_charge[0] == empreinte:
+                print(f"Déjà chargé dans la base : {chemin_fichier}")
+                continue
+
+            with Etape("chargement dans la base") as etape:
+                table = charger_table_fichier(chemin_fichier)
+                etape.lignes = len(table)
+                with connexion:
+                    connexion.execute("DELETE FROM equipage WHERE intervention IN "
+                                      "(SELECT id FROM interventions WHERE fichier = ?)", (cle,))
+                    connexion.execute("DELETE FROM interventions WHERE fichier = ?", (cle,))
+                    connexion.execute("INSERT OR REPLACE INTO fichiers VALUES (?, ?, ?)",
+                                      (cle, empreinte, len(table)))
+                    premier_id = connexion.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM interventions").fetchone()[0]
+                    interventions, equipage = lignes_base(table, premier_id)
+                    connexion.executemany(
+                        f"INSERT INTO interventions ({', '.join(colonnes)}) "
+                        f"VALUES ({', '.join('?' * len(colonnes))})",
+                        ((identifiant, cle, *valeurs) for identifiant, *valeurs in interventions))
+                    connexion.executemany("INSERT INTO equipage VALUES (?, ?, ?)", equipage)
+            print(f"Chargé dans la base : {chemin_fichier} ({len(table)} interventions)")
+    finally:
+        connexion.close()
+
+
+def main_base(dossier_donnees=DATA_DIR, chemin_base=BASE_PATH):
+    chemins = [f"{dossier_donnees}/{nom_fichier}" for nom_fichier in sorted(os.listdir(dossier_donnees))
+               if nom_fichier.lower().endswith(".csv")]
+    if not chemins:
+        print(f"Aucun export trouvé dans {dossier_donnees}")
+        return
+    charger_dans_base(chemins, chemin_base)
+
+
+def requete(connexion, sql, debut=None, fin=None, conditions=(), parametres=()):
+    """Exécute une requête sur les interventions d'une période.
+
+    `sql` contient {ou} à la place des conditions de sa clause WHERE, la
+    table interventions y étant nommée i. `debut` et `fin` ("aaaa-mm-jj",
+    inclus) limitent la période ; les interventions sans date lisible ne
+    sont prises que sans limite.
+    """
+    conditions = list(conditions)
+    parametres = list(parametres)
+    if debut is not None:
+        conditions.append("i.date >= ?")
+        parametres.append(debut)
+    if fin is not None:
+        conditions.append("i.date <= ?")
+        parametres.append(fin)
+    return connexion.execute(sql.format(ou=" AND ".join(conditions) or "1"), parametres).fetchall()
+
+
+def comptes_sql(connexion, colonne, libelles_initiaux=(), debut=None, fin=None, conditions=()):
+    # {libellé: nombre} d'une colonne catégorielle, les libellés initiaux
+    # d'abord puis les autres dans l'ordre de première apparition
+    comptes = dict.fromkeys(libelles_initiaux, 0)
+    for libelle, nombre in requete(connexion, f"SELECT i.{colonne}, COUNT(*) FROM interventions i "
+                                              f"WHERE {{ou}} GROUP BY i.{colonne} ORDER BY MIN(i.id)",
+                                   debut, fin, [f"i.{colonne} IS NOT NULL", *conditions]):
+        comptes[libelle] = nombre
+    return comptes
+
+
+def sql_nb_interventions(connexion, debut=None, fin=None):
+    return requete(connexion, "SELECT COUNT(*) FROM interventions i WHERE {ou}", debut, fin)[0][0]
+
+
+def sql_repartition_priorites(connexion, debut=None, fin=None):
+    return comptes_sql(connexion, "priorite", PRIORITES, debut, fin)
+
+
+def sql_repartition_ambulances(connexion, debut=None, fin=None):
+    return comptes_sql(connexion, "ambulance", AMBULANCES, debut, fin)
+
+
+def sql_repartition_nacas(connexion, debut=None, fin=None):
+    return comptes_sql(connexion, "naca", NACAS, debut, fin)
+
+
+def sql_naca_of_p3(connexion, debut=None, fin=None):
+    return comptes_sql(connexion, "naca", NACAS, debut, fin, ["i.priorite = 'P3'"])
+
+
+def sql_repartition_motif_est(connexion, debut=None, fin=None):
+    motifs = comptes_sql(connexion, "motif_est", (), debut, fin)
+    return dict(sorted(motifs.items(), key=lambda item: item[1], reverse=True))
+
+
+def sql_age_patients(connexion, debut=None, fin=None):
+    return dict(requete(connexion, "SELECT i.age, COUNT(*) FROM interventions i WHERE {ou} "
+                                   "GROUP BY i.age ORDER BY i.age",
+                        debut, fin, ["i.age IS NOT NULL", "i.a_date_naissance"]))
+
+
+def sql_nb_inter_by_heure(connexion, debut=None, fin=None):
+    inter_by_heure = {str(h).zfill(2): 0 for h in range(24)}
+    for heure, nombre in requete(connexion, "SELECT i.sur_site / 60, COUNT(*) FROM interventions i "
+                                            "WHERE {ou} GROUP BY i.sur_site / 60",
+                                 debut, fin, ["i.sur_site IS NOT NULL"]):
+        inter_by_heure[str(heure).zfill(2)] = nombre
+    return inter_by_heure
 
-def get_fastest_avc(lecteur):
-    next(lecteur, None)  # saute l'en-tête
 
-    # on initialise le temps minimum à l'infini pour pouvoir le comparer avec les temps calculés
-    temps_min = float('inf')
-    leader_min = None
-    equipier_min = None
-    date_min = None
+def sql_temps_sur_site(connexion, debut=None, fin=None):
+    # comme TempsSurSite : les lignes sans heure d'hôpital sont ignorées
+    nombre, total = requete(connexion, "SELECT COUNT(*), COALESCE(SUM(i.instant_quebec - i.instant_sur_site), 0) "
+                                       "FROM interventions i WHERE {ou}",
+                            debut, fin, ["i.instant_sur_site IS NOT NULL", "i.instant_quebec IS NOT NULL",
+                                         "i.hopital IS NOT NULL"])[0]
+    total_temps = total / 60
+    return {"total_temps_sur_site": total_temps, "nombre_interventions": nombre, "moyenne": total_temps / nombre if nombre > 0 else 0}
 
-    for ligne in lecteur:
-        # si la colonne Hopital (index 17) est vide, on ignore la ligne
-        if not ligne[17].strip():
-            continue
-        if ligne[24].strip()[:4] != "1105":
-            continue
-        if ligne[25].strip() != "1":
-            continue
 
-        # extraire l'heure depuis la colonne "alarme" (index 13)
-        alarme_raw = ligne[13].strip()
-        tmp = datetime.strptime(alarme_raw, "%H:%M")
-        sur_site_hour = tmp.hour + tmp.minute / 60
-
-        # extraire l'heure depuis la colonne "hopital" (index 17)
-        hopital_raw = ligne[17].strip()
-        tmp = datetime.strptime(hopital_raw, "%H:%M")
-        hopital_hour = tmp.hour + tmp.minute / 60
-
-        temps_inter = hopital_hour - sur_site_hour
-        if temps_inter < 0:
-            temps_inter += 24  # gérer les cas où l'heure de Québec est le lendemain
-        if temps_inter < temps_min:
-            temps_min = temps_inter
-            leader_min = ligne[7].strip()
-            equipier_min = ligne[8].strip()
-            date_min = ligne[0].strip()
-    # print(
-    #     f"Prise en charge AVC la plus rapide : {decimal_vers_hhmm(temps_min)} par {leader_min} et {equipier_min} le {date_min}")
-    return (temps_min, leader_min, equipier_min, date_min)
+def sql_quantiles_durees(connexion, debut=None, fin=None):
+    # histogrammes de QuantilesDurees remplis par un GROUP BY sur la durée
+    agregateur = QuantilesDurees()
+    for nom, (debut_duree, fin_duree) in DUREES_SUIVIES.items():
+        histogrammes = agregateur.histogrammes[nom]
+        for priorite, duree, nombre in requete(
+                connexion, f"SELECT i.priorite, i.instant_{fin_duree} - i.instant_{debut_duree} AS duree, COUNT(*) "
+                           "FROM interventions i WHERE {ou} GROUP BY i.priorite, duree",
+                debut, fin, [f"i.instant_{debut_duree} IS NOT NULL", f"i.instant_{fin_duree} IS NOT NULL",
+                             "i.hopital IS NOT NULL"]):
+            for cle in ["toutes"] + ([priorite] if priorite is not None else []):
+                histogramme = histogrammes.get(cle, np.zeros(0, dtype=np.int64))
+                if len(histogramme) <= duree:
+                    histogramme = np.pad(histogramme, (0, max(24 * 60, duree + 1) - len(histogramme)))
+                histogramme[duree] += nombre
+                histogrammes[cle] = histogramme
+    return agregateur.resultat()
 
 
-def get_longest_inter(lecteur):
-    next(lecteur, None)  # saute l'en-tête
-
-    # on initialise le temps maximum à 0 pour pouvoir le comparer avec les temps calculés
-    temps_max = 0
-    leader_max = None
-    equipier_max = None
-    date_max = None
-    fip_max = None
-
-    for ligne in lecteur:
-        # si la colonne Hopital (index 17) est vide, on ignore la ligne
-        if not ligne[17].strip():
-            continue
+def equipage_sql(sql, roles=("leader", "equipier")):
+    # requête sur les lignes (e : membre d'équipage, i : son intervention) des roles donnés
+    return sql.format(
+        equipage="equipage e JOIN interventions i ON i.id = e.intervention",
+        ou=f"e.role IN ({', '.join(repr(role) for role in roles)}) AND {{ou}}")
 
-        # extraire l'heure depuis la colonne "Sur site" (index 15)
-        sur_site_raw = ligne[15].strip()
-        tmp = datetime.strptime(sur_site_raw, "%H:%M")
-        sur_site_hour = tmp.hour + tmp.minute / 60
-
-        # extraire l'heure depuis la colonne "Quebec" (index 16)
-        quebec_raw = ligne[16].strip()
-        tmp = datetime.strptime(quebec_raw, "%H:%M")
-        quebec_hour = tmp.hour + tmp.minute / 60
-
-        temps_inter = quebec_hour - sur_site_hour
-        if temps_inter < 0:
-            temps_inter += 24  # gérer les cas où l'heure de Québec est le lendemain
-        if temps_inter > 10:
-            continue  # on ignore les interventions de moplus de 12h qui sont probablement des erreurs de saisie
-        if temps_inter > temps_max:
-            temps_max = temps_inter
-            leader_max = ligne[7].strip()
-            equipier_max = ligne[8].strip()
-            date_max = ligne[0].strip()
-            fip_max = ligne[3].strip()
-    # print(
-    #     f"Intervention la plus longue : {decimal_vers_hhmm(temps_max)} par {leader_max} et {equipier_max} le {date_max} (FIP: {fip_max})")
-    return (temps_max, leader_max, equipier_max, date_max)
 
+def sql_stats_par_personne(connexion, debut=None, fin=None):
+    # même résultat que StatsParPersonne : chaque intervention compte pour son leader et son équipier
+    par_personne = {}
+    for personne, *totaux in requete(connexion, equipage_sql(
+            "SELECT e.personne, COUNT(*), COUNT(i.sur_site), "
+            "COALESCE(SUM(i.sur_site / 60 BETWEEN 2 AND 5), 0), COALESCE(SUM(i.age < 16), 0), "
+            "COALESCE(SUM(i.depart / 60 = 12), 0), COUNT(i.age), COALESCE(SUM(i.age), 0) "
+            "FROM {equipage} WHERE {ou} GROUP BY e.personne ORDER BY MIN(e.rowid)"), debut, fin):
+        par_personne[personne] = {**dict(zip(CHAMPS_PAR_PERSONNE, totaux)), "nacas": {}}
+    for personne, naca, nombre in requete(connexion, equipage_sql(
+            "SELECT e.personne, i.naca, COUNT(*) FROM {equipage} WHERE {ou} "
+            "GROUP BY e.personne, i.naca ORDER BY MIN(i.id)"), debut, fin, ["i.naca IS NOT NULL"]):
+        par_personne[personne]["nacas"][naca] = nombre
+    return par_personne
 
-def get_patient_age_moyen_by_ambulancier(lecteur):
-    next(lecteur, None)  # saute l'en-tête
-    ambu_ages = {}
 
-    for ligne in lecteur:
-        leader = ligne[7].strip()
-        equipier = ligne[8].strip()
-        age_str = ligne[32].strip()
+def sql_classements(connexion, debut=None, fin=None):
+    return classements_par_personne(sql_stats_par_personne(connexion, debut, fin))
 
-        if age_str.isdigit():
-            age = int(age_str)
-            if leader not in ambu_ages:
-                ambu_ages[leader] = []
-            ambu_ages[leader].append(age)
-            if equipier not in ambu_ages:
-                ambu_ages[equipier] = []
-            ambu_ages[equipier].append(age)
 
-    ambu_ages_moyen = {personne: np.mean(ages)
-                       for personne, ages in ambu_ages.items()}
+def sql_nacas_par_personne(connexion, nacas=NACAS_HAUTS, debut=None, fin=None):
+    """Nombre d'interventions de chaque personne dont le NACA est dans `nacas`.
 
-    # on garde uniquement les personnes qui ont au moins LIMITE_MIN_INTER interventions pour éviter les biais liés à un petit nombre d'interventions
-    ambu_ages_moyen = {personne: age_moyen for personne, age_moyen in ambu_ages_moyen.items(
-    ) if len(ambu_ages[personne]) >= LIMITE_MIN_INTER}
+    Une seule requête sur les index du NACA et de l'équipage, par exemple
+    les NACAs 5 et plus de chaque personne depuis le début de l'année :
+    sql_nacas_par_personne(connexion, NACAS_HAUTS, "2025-01-01").
+    """
+    return dict(requete(connexion, equipage_sql(
+        f"SELECT e.personne, COUNT(*) AS nombre FROM {{equipage}} WHERE {{ou}} "
+        f"GROUP BY e.personne ORDER BY nombre DESC, MIN(e.rowid)"),
+        debut, fin, [f"i.naca IN ({', '.join('?' * len(nacas))})"], nacas))
 
-    sorted_ambu_ages_moyen = dict(
-        sorted(ambu_ages_moyen.items(), key=lambda item: item[1], reverse=True))
-    return sorted_ambu_ages_moyen
 
+def sql_naca_by_personne(connexion, debut=None, fin=None):
+    return sql_classements(connexion, debut, fin)["naca_by_personne"]
 
-def get_nbmax_inter_ped(lecteur):
-    next(lecteur, None)  # saute l'en-tête
-    inter_ped = {}
-
-    for ligne in lecteur:
-        leader = ligne[7].strip()
-        equipier = ligne[8].strip()
-        age = ligne[32].strip()
-
-        if age.isdigit() and int(age) < 16:
-            if leader not in inter_ped:
-                inter_ped[leader] = 0
-            inter_ped[leader] += 1
-            if equipier not in inter_ped:
-                inter_ped[equipier] = 0
-            inter_ped[equipier] += 1
-
-    sorted_inter_ped = dict(
-        sorted(inter_ped.items(), key=lambda item: item[1], reverse=True))
-    # on garde que les personnes ayant le plus d'interventions pédiatriques
-    sorted_inter_ped = {personne: count for personne, count in sorted_inter_ped.items(
-    ) if count == max(inter_ped.values())}
-    return sorted_inter_ped
 
+def sql_nacas_hauts(connexion, debut=None, fin=None):
+    return sql_classements(connexion, debut, fin)["nacas_hauts"]
 
-def get_max_depart_a_midi(lecteur):
-    next(lecteur, None)  # saute l'en-tête
-    nb_depart_a_midi_by_personne = {}
-
-    for ligne in lecteur:
-        leader = ligne[7].strip()
-        equipier = ligne[8].strip()
-        horaire_str = ligne[14].strip()
-
-        if re.match(r'^\d{2}:\d{2}$', horaire_str):
-            heure = int(horaire_str.split(":")[0])
-            if heure == 12:
-                if leader:
-                    if leader not in nb_depart_a_midi_by_personne:
-                        nb_depart_a_midi_by_personne[leader] = 0
-                    nb_depart_a_midi_by_personne[leader] += 1
-                if equipier:
-                    if equipier not in nb_depart_a_midi_by_personne:
-                        nb_depart_a_midi_by_personne[equipier] = 0
-                    nb_depart_a_midi_by_personne[equipier] += 1
-
-    sorted_nb_depart_a_midi_by_personne = dict(
-        sorted(nb_depart_a_midi_by_personne.items(), key=lambda item: item[1], reverse=True))
-    return sorted_nb_depart_a_midi_by_personne
-
-
-def pdf_header(canvas, doc):
+
+def sql_nacas_bas(connexion, debut=None, fin=None):
+    return sql_classements(connexion, debut, fin)["nacas_bas"]
+
+
+def sql_nb_inter_nuit_par_personne(connexion, debut=None, fin=None):
+    return sql_classements(connexion, debut, fin)["inter_nuit"]
+
+
+def sql_most_interventions_by_personne(connexion, debut=None, fin=None):
+    return sql_classements(connexion, debut, fin)["nb_inter_by_personne"]
+
+
+def sql_patient_age_moyen_by_ambulancier(connexion, debut=None, fin=None):
+    return sql_classements(connexion, debut, fin)["age_moyen_by_ambu"]
+
+
+def sql_nbmax_inter_ped(connexion, debut=None, fin=None):
+    return sql_classements(connexion, debut, fin)["nb_inter_ped"]
+
+
+def sql_max_depart_a_midi(connexion, debut=None, fin=None):
+    return sql_classements(connexion, debut, fin)["nb_depart_a_midi_by_personne"]
+
+
+def sql_matrice_binomes(connexion, debut=None, fin=None):
+    # même résultat que MatriceBinomes : chaque paire de personnes distinctes d'une
+    # intervention, les partenaires de chacun dans l'ordre de leur première
+    # intervention ensemble (rang : position du membre dans la table equipage)
+    partenaires = {}
+    for personne, partenaire, nombre in requete(
+            connexion, "WITH membres AS (SELECT e.intervention, e.personne, MIN(e.rowid) AS rang "
+                       "FROM equipage e JOIN interventions i ON i.id = e.intervention WHERE {ou} "
+                       "GROUP BY e.intervention, e.personne) "
+                       "SELECT a.personne, b.personne, COUNT(*) FROM membres a JOIN membres b "
+                       "ON a.intervention = b.intervention AND a.personne < b.personne "
+                       "GROUP BY a.personne, b.personne "
+                       "ORDER BY MIN(3 * MIN(a.rang, b.rang) + ABS(a.rang - b.rang))", debut, fin):
+        for a, b in ((personne, partenaire), (partenaire, personne)):
+            partenaires.setdefault(a, {})[b] = nombre
+    return partenaires
+
+
+def sql_most_interventions_by_binome(connexion, debut=None, fin=None):
+    return classements_binomes(sql_matrice_binomes(connexion, debut, fin))["nb_inter_by_binome"]
+
+
+def intervention_extreme_sql(connexion, debut_duree, fin_duree, ordre, debut=None, fin=None, conditions=()):
+    # (durée en heures, leader, équipier, date) de l'intervention de durée minimale
+    # ou maximale (`ordre`), la première chargée à égalité ; None si aucune
+    ligne = requete(connexion, f"SELECT i.instant_{fin_duree} - i.instant_{debut_duree} AS duree, "
+                               "(SELECT personne FROM equipage WHERE intervention = i.id AND role = 'leader'), "
+                               "(SELECT personne FROM equipage WHERE intervention = i.id AND role = 'equipier'), "
+                               f"i.date_export FROM interventions i WHERE {{ou}} ORDER BY duree {ordre}, i.id LIMIT 1",
+                    debut, fin, [f"i.instant_{debut_duree} IS NOT NULL", f"i.instant_{fin_duree} IS NOT NULL",
+                                 *conditions])
+    if not ligne:
+        return None
+    duree, leader, equipier, date = ligne[0]
+    return (duree / 60, leader or "", equipier or "", date)
+
+
+def sql_fastest_avc(connexion, debut=None, fin=None):
+    # AVC (motif 1105) de degré 1 amenés à l'hôpital, comme AvcLePlusRapide
+    return intervention_extreme_sql(connexion, "alarme", "hopital", "ASC", debut, fin,
+                                    ["substr(i.motif_est, 1, 4) = '1105'", "i.degre_est = '1'"]
+                                    ) or (float('inf'), None, None, None)
+
+
+def sql_longest_inter(connexion, debut=None, fin=None):
+    # comme InterventionLaPlusLongue : sans les interventions de plus de 10h
+    return intervention_extreme_sql(connexion, "sur_site", "quebec", "DESC", debut, fin,
+                                    ["i.hopital IS NOT NULL",
+                                     "i.instant_quebec - i.instant_sur_site <= 600"]) or (0, None, None, None)
+
+
+def sql_occupation_flotte(connexion, debut=None, fin=None):
+    # intervalles des missions lus dans la base, puis même balayage que OccupationFlotte
+    agregateur = OccupationFlotte()
+    for date, nombre in requete(connexion, "SELECT i.date, COUNT(*) FROM interventions i WHERE {ou} GROUP BY i.date",
+                                debut, fin, ["i.date IS NOT NULL"]):
+        agregateur.jours[datetime.fromisoformat(date).toordinal()] = nombre
+    lignes = requete(connexion, f"SELECT i.ambulance, {', '.join(f'i.instant_{phase}' for phase in PHASES)} "
+                                "FROM interventions i WHERE {ou} ORDER BY i.id",
+                     debut, fin, ["i.date IS NOT NULL", "i.ambulance IS NOT NULL"])
+    if lignes:
+        ambulances, horodatages = np.array([ligne[0] for ligne in lignes]), np.array(
+            [[-1 if instant is None else instant for instant in ligne[1:]] for ligne in lignes], dtype=np.int64)
+        debuts = np.where(horodatages >= 0, horodatages, np.iinfo(np.int64).max).min(axis=1)
+        fins = horodatages.max(axis=1)
+        for ambulance in dict.fromkeys(ambulances.tolist()):
+            masque = (ambulances == ambulance) & (fins > debuts)
+            if masque.any():
+                agregateur.ajouter_missions(ambulance, debuts[masque], fins[masque])
+    return agregateur.resultat()
+
+
+# équivalent SQL de chaque agrégateur de AGREGATEURS
+REQUETES_AGREGATEURS = {
+    "nb_interventions": sql_nb_interventions,
+    "priorites": sql_repartition_priorites,
+    "ambulances": sql_repartition_ambulances,
+    "nacas": sql_repartition_nacas,
+    "ages": sql_age_patients,
+    "inter_by_heure": sql_nb_inter_by_heure,
+    "temps_sur_site": sql_temps_sur_site,
+    "quantiles_durees": sql_quantiles_durees,
+    "motifs_EST": sql_repartition_motif_est,
+    "par_personne": sql_stats_par_personne,
+    "nacas_p3": sql_naca_of_p3,
+    "binomes": sql_matrice_binomes,
+    "occupation": sql_occupation_flotte,
+    "fastest_avc": sql_fastest_avc,
+    "longest_inter": sql_longest_inter,
+}
+
+
+def resultats_base(connexion, debut=None, fin=None):
+    # comme resultats_agregateurs, mais par des requêtes sur la base
+    resultats = {nom: requete_sql(connexion, debut, fin) for nom, requete_sql in REQUETES_AGREGATEURS.items()}
+    resultats.update(classements_par_personne(resultats["par_personne"]))
+    resultats.update(classements_binomes(resultats["binomes"]))
+    return resultats
+
+
+# Graphiques en barres dessinés directement dans le PDF avec reportlab.graphics
+# (--vectoriel) : ni matplotlib ni PNG intermédiaire, un PDF plus léger et net
+# à tous les zooms. Mêmes palettes et mêmes textes que les create_graph_*.
+TAILLE_DESSIN = (6, 4)  # en pouces, comme les images du rapport
+
+
+def dessin_barres(valeurs, couleurs, titre, libelle_y, libelle_x=None, pourcentages=True, rotation=0):
+    from reportlab.graphics.charts.barcharts import VerticalBarChart
+    from reportlab.graphics.shapes import Drawing, String
+    from reportlab.lib.colors import HexColor, black
+    from reportlab.lib.units import inch
+
+    largeur, hauteur = TAILLE_DESSIN[0] * inch, TAILLE_DESSIN[1] * inch
+    dessin = Drawing(largeur, hauteur)
+    barres = VerticalBarChart()
+    barres.x, barres.y = 55, 45 if rotation else 35
+    barres.width, barres.height = largeur - 75, hauteur - barres.y - 40
+    barres.data = [list(valeurs.values())]
+    barres.categoryAxis.categoryNames = list(valeurs.keys())
+    barres.categoryAxis.labels.angle = rotation
+    barres.categoryAxis.labels.boxAnchor = "ne" if rotation else "n"
+    barres.categoryAxis.labels.fontSize = 8
+    barres.valueAxis.valueMin = 0
+    barres.valueAxis.rangeRound = "ceiling"  # de la place au-dessus de la plus haute barre
+    barres.valueAxis.labels.fontSize = 8
+    barres.barSpacing = 0
+    barres.groupSpacing = 6
+    barres.bars.strokeColor = black
+    for i, couleur in enumerate(couleurs):
+        barres.bars[(0, i)].fillColor = HexColor(couleur)
+    if pourcentages:
+        total = sum(valeurs.values())
+        barres.barLabelFormat = lambda v: f"{(v / total) * 100 if total > 0 else 0:.2f}%"
+        barres.barLabels.nudge = 6
+        barres.barLabels.fontSize = 7
+    dessin.add(barres)
+
+    dessin.add(String(largeur / 2, hauteur - 18, titre, textAnchor="middle",
+                      fontName="Helvetica", fontSize=12))
+    axe_y = String(0, 0, libelle_y, textAnchor="middle", fontName="Helvetica", fontSize=9)
+    dessin.add(Drawing(0, 0, axe_y, transform=(0, 1, -1, 0, 15, barres.y + barres.height / 2)))
+    if libelle_x:
+        dessin.add(String(barres.x + barres.width / 2, 8, libelle_x, textAnchor="middle",
+                          fontName="Helvetica", fontSize=9))
+    return dessin
+
+
+def dessin_priorites(priorites):
+    return dessin_barres(priorites, [PALETTE_PRIORITE[k] for k in priorites],
+                         "Répartition des interventions par priorités", "Nombre d'interventions", rotation=15)
+
+
+def dessin_ambulances(ambulances):
+    return dessin_barres(ambulances, [PALETTE_AMBULANCES[i % len(PALETTE_AMBULANCES)] for i in range(len(ambulances))],
+                         "Répartition interventions par ambulance", "Nombre d'interventions")
+
+
+def dessin_nacas(nacas):
+    return dessin_barres(nacas, [PALETTE_NACA[k] for k in nacas],
+                         "Répartition interventions par NACA", "Nombre d'interventions", "NACA")
+
+
+def dessin_heures(inter_by_heure):
+    return dessin_barres(inter_by_heure, [PALETTE_HEURES[k] for k in inter_by_heure],
+                         "Nombre d'interventions par heure", "Nombre d'interventions", "Heure", pourcentages=False)
+
+
+# graphique du rapport -> dessin vectoriel (les autres restent des PNG matplotlib)
+DESSINS_VECTORIELS = {
+    "priorites": dessin_priorites,
+    "ambulances": dessin_ambulances,
+    "nacas": dessin_nacas,
+    "inter_by_heure": dessin_heures,
+}
+
+
+# textes du rapport qui dépendent de la période couverte (un mois ou plusieurs mois de l'année)
+TEXTES_PERIODE = {
+    "mois": {"rapport": "mensuel", "ce": "ce mois-ci"},
+    "annee": {"rapport": "annuel", "ce": "cette année"},
+}
+
+
+def pdf_header(canvas, doc, mois=MOIS, annee=ANNEE, periode="mois", nb_pages=6, filtre=""):
+    from reportlab.lib.units import cm
     canvas.saveState()
 
     canvas.setFont("Helvetica-Bold", 10)
 
     # Texte en haut à gauche
-    canvas.drawString(2*cm, 28*cm, "ACE - Rapport mensuel - " +
-                      MOIS.capitalize() + " " + ANNEE)
+    canvas.drawString(2*cm, 28*cm, f"ACE - Rapport {TEXTES_PERIODE[periode]['rapport']} - " +
+                      (mois.capitalize() + " " + annee).strip() + (f" - {filtre}" if filtre else ""))
 
     # Page actuelle sur nombre de page en haut a droite
-    canvas.drawRightString(19*cm, 28*cm, f"Page {doc.page}/6")
+    canvas.drawRightString(19*cm, 28*cm, f"Page {doc.page}/{nb_pages}")
 
     # Ligne sous l'en-tête
     canvas.line(2*cm, 27.7*cm, 19*cm, 27.7*cm)
@@ -759,8 +2597,21 @@ def pdf_header(canvas, doc):
     canvas.restoreState()
 
 
-def generate_pdf_report(nombre_interventions, temps_moyen_sur_site, age_moyen, motifs_EST, nacas_bas, nacas_hauts, nacas_p3, inter_nuit, nb_inter_by_personne, nb_inter_by_binome, fastest_avc, age_moyen_by_ambu, nb_inter_ped, nb_depart_a_midi_by_personne):
-    doc = SimpleDocTemplate(OUTPUT_PATH, pagesize=A4)
+def generate_pdf_report(nombre_interventions, temps_moyen_sur_site, age_moyen, motifs_EST, nacas_bas, nacas_hauts, nacas_p3, inter_nuit, nb_inter_by_personne, nb_inter_by_binome, fastest_avc, age_moyen_by_ambu, nb_inter_ped, nb_depart_a_midi_by_personne, output_path=OUTPUT_PATH, graphiques=None, mois=MOIS, annee=ANNEE, periode="mois", quantiles_durees=None, occupation=None, filtre=""):
+    from reportlab.platypus import SimpleDocTemplate, Image, Spacer, Paragraph, PageBreak, Table, TableStyle
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import inch
+
+    if graphiques is None:
+        graphiques = chemins_graphiques(OUTPUT_DIR)
+
+    def element_graphique(graphique):
+        # chemin d'un PNG, ou dessin reportlab déjà à la bonne taille
+        if isinstance(graphique, str):
+            return Image(graphique, width=6 * inch, height=4 * inch)
+        return graphique
+    doc = SimpleDocTemplate(output_path, pagesize=A4)
     styles = getSampleStyleSheet()
     elements = []
     style_texte = {'texte_grand': ParagraphStyle(
@@ -780,16 +2631,19 @@ def generate_pdf_report(nombre_interventions, temps_moyen_sur_site, age_moyen, m
         leading=25
     )}
 
+    # "ce mois-ci" ou "cette année" selon la période du rapport
+    ce = TEXTES_PERIODE[periode]["ce"]
+
     # Ajouter un titre
     title = Paragraph(
-        "Rapport Mensuel - Interventions Ambulance<br/>" +
-        MOIS.capitalize() + " " + ANNEE, styles['Title'])
+        f"Rapport {TEXTES_PERIODE[periode]['rapport'].capitalize()} - Interventions Ambulance<br/>" +
+        (mois.capitalize() + " " + annee).strip() + (f"<br/>{filtre}" if filtre else ""), styles['Title'])
     elements.append(title)
     elements.append(Spacer(1, 0.5 * inch))
 
     # Ajouter le nombre d'interventions
     texte_nombre_interventions = (
-        f"Ce mois, ACE a effectué "
+        f"{ce.capitalize()}, ACE a effectué "
         f"<font color='#D62828'><b>{nombre_interventions} interventions</b></font> "
         f"entre l'urgence et la P3."
     )
@@ -797,17 +2651,20 @@ def generate_pdf_report(nombre_interventions, temps_moyen_sur_site, age_moyen, m
                     style_texte['texte_grand']))
     elements.append(Spacer(1, 0.5 * inch))
 
-    # Ajouter la personne avec le plus d'interventions
-    personne_max = max(nb_inter_by_personne, key=nb_inter_by_personne.get)
-    texte_nb_inter_max = f"C'est <b>{personne_max.split(' ')[0]} {personne_max.split(' ')[1][0]}.</b> qui en a effectué le plus, avec <b>{nb_inter_by_personne[personne_max]}</b> interventions."
-    elements.append(Paragraph(texte_nb_inter_max,
-                    style_texte['texte_grand']))
+    # Ajouter la personne avec le plus d'interventions (les phrases dont les
+    # chiffres manquent, dans un sous-rapport filtré par exemple, sont omises)
+    if nb_inter_by_personne:
+        personne_max = max(nb_inter_by_personne, key=nb_inter_by_personne.get)
+        texte_nb_inter_max = f"C'est <b>{abreger_nom(personne_max)}</b> qui en a effectué le plus, avec <b>{nb_inter_by_personne[personne_max]}</b> interventions."
+        elements.append(Paragraph(texte_nb_inter_max,
+                        style_texte['texte_grand']))
 
     # Ajouter le binome avec le plus d'interventions
-    binome_max = max(nb_inter_by_binome, key=nb_inter_by_binome.get)
-    texte_nb_inter_binome_max = f"Et c'est <b>{binome_max}</b> qui en ont effectué le plus ensemble, avec <b>{nb_inter_by_binome[binome_max]}</b> interventions."
-    elements.append(Paragraph(texte_nb_inter_binome_max,
-                    style_texte['texte_grand']))
+    if nb_inter_by_binome:
+        binome_max = max(nb_inter_by_binome, key=nb_inter_by_binome.get)
+        texte_nb_inter_binome_max = f"Et c'est <b>{binome_max}</b> qui en ont effectué le plus ensemble, avec <b>{nb_inter_by_binome[binome_max]}</b> interventions."
+        elements.append(Paragraph(texte_nb_inter_binome_max,
+                        style_texte['texte_grand']))
     elements.append(Spacer(1, 0.5 * inch))
 
     # Ajouter les motifs EST les plus courants
@@ -839,17 +2696,16 @@ def generate_pdf_report(nombre_interventions, temps_moyen_sur_site, age_moyen, m
 
     # Ajouter le temps de prise en charge AVC le plus rapide
     temps_avc, leader_avc, equipier_avc, date_avc = fastest_avc
-    leader_avc = leader_avc.split(
-        " ")[0] + " " + leader_avc.split(" ")[1][0] + "."
-    equipier_avc = equipier_avc.split(
-        " ")[0] + " " + equipier_avc.split(" ")[1][0] + "."
-    texte_avc_rapide = (
-        f"Bravo à <b>{leader_avc} et {equipier_avc}</b> pour la prise en charge AVC la plus rapide, avec un temps de prise en charge de "
-        f"<font color='#D62828'><b>{decimal_vers_hhmm(temps_avc)}</b></font>"
-        f" entre l'alarme et l'arrivée à l'hôpital, le {date_avc}."
-    )
-    elements.append(Paragraph(texte_avc_rapide, style_texte['texte_grand']))
-    elements.append(Spacer(1, 0.5 * inch))
+    if date_avc is not None:
+        leader_avc = abreger_nom(leader_avc)
+        equipier_avc = abreger_nom(equipier_avc)
+        texte_avc_rapide = (
+            f"Bravo à <b>{leader_avc} et {equipier_avc}</b> pour la prise en charge AVC la plus rapide, avec un temps de prise en charge de "
+            f"<font color='#D62828'><b>{decimal_vers_hhmm(temps_avc)}</b></font>"
+            f" entre l'alarme et l'arrivée à l'hôpital, le {date_avc}."
+        )
+        elements.append(Paragraph(texte_avc_rapide, style_texte['texte_grand']))
+        elements.append(Spacer(1, 0.5 * inch))
 
     # Texte idées
     texte_idees = "(J'en profite pour vous dire que si vous avez des idées de statistiques ou de graphiques que vous aimeriez voir dans ce rapport, n'hésitez pas à les écrire directement dessus au stylo ! Je les ajouterai avec plaisir pour le mois prochain !)"
@@ -866,16 +2722,42 @@ def generate_pdf_report(nombre_interventions, temps_moyen_sur_site, age_moyen, m
     elements.append(Spacer(1, 0.5 * inch))
 
     # Graphique des priorités
-    img = Image(GRAPH_PRIORITES_PATH, width=6 * inch, height=4 * inch)
+    img = element_graphique(graphiques["priorites"])
     elements.append(img)
     elements.append(Spacer(1, 0.5 * inch))
 
     # Naca pour la p3
     total_nacas_p3 = sum(nacas_p3.values())
     p3_naca_hauts = sum(nacas_p3[naca] for naca in ["4", "5", "6", "7"])
-    texte_naca_p3 = f"Ce mois ci, en <b><font color='#D62828'>P3</font></b>, <b>{p3_naca_hauts}</b> interventions sur <b>{total_nacas_p3}</b> ont été classées en NACA 4+, soit <b>{(p3_naca_hauts / total_nacas_p3) * 100:.1f}%</b> des P3."
-    elements.append(Paragraph(texte_naca_p3, style_texte['texte_grand']))
-    elements.append(Spacer(1, 0.5 * inch))
+    if total_nacas_p3:
+        texte_naca_p3 = f"{ce.capitalize()}, en <b><font color='#D62828'>P3</font></b>, <b>{p3_naca_hauts}</b> interventions sur <b>{total_nacas_p3}</b> ont été classées en NACA 4+, soit <b>{(p3_naca_hauts / total_nacas_p3) * 100:.1f}%</b> des P3."
+        elements.append(Paragraph(texte_naca_p3, style_texte['texte_grand']))
+        elements.append(Spacer(1, 0.5 * inch))
+
+    # Tableau des durées (médiane, 90e et 99e centiles) par priorité
+    if quantiles_durees is not None:
+        texte_durees = "Temps entre l'arrivée sur site et le Québec, et entre l'alarme et l'hôpital : la moitié (p50), 90% (p90) et 99% (p99) des interventions ont duré au plus :"
+        elements.append(Paragraph(texte_durees, style_texte['texte_normal']))
+        elements.append(Spacer(1, 0.2 * inch))
+        lignes_tableau = [["", "Sur site - Québec", "", "", "Alarme - hôpital", "", ""],
+                          ["Priorité"] + list(QUANTILES) * 2]
+        for priorite in ["toutes"] + PRIORITES:
+            ligne = [priorite.capitalize()]
+            for nom in DUREES_SUIVIES:
+                quantiles = quantiles_durees[nom].get(priorite)
+                ligne += [minutes_vers_hhmm(quantiles[q]) if quantiles else "-" for q in QUANTILES]
+            lignes_tableau.append(ligne)
+        tableau = Table(lignes_tableau)
+        tableau.setStyle(TableStyle([
+            ('SPAN', (1, 0), (3, 0)), ('SPAN', (4, 0), (6, 0)),
+            ('FONTNAME', (0, 0), (-1, 1), 'Helvetica-Bold'),
+            ('ALIGN', (1, 0), (-1, -1), 'CENTER'),
+            ('LINEBELOW', (0, 1), (-1, 1), 1, '#D62828'),
+            ('LINEBEFORE', (1, 0), (1, -1), 0.5, '#777777'),
+            ('LINEBEFORE', (4, 0), (4, -1), 0.5, '#777777'),
+        ]))
+        elements.append(tableau)
+        elements.append(Spacer(1, 0.5 * inch))
 
     # saut de page
     elements.append(PageBreak())
@@ -887,7 +2769,7 @@ def generate_pdf_report(nombre_interventions, temps_moyen_sur_site, age_moyen, m
     elements.append(Spacer(1, 0.5 * inch))
 
     # Graphique des NACAs
-    img = Image(GRAPH_NACAS_PATH, width=6 * inch, height=4 * inch)
+    img = element_graphique(graphiques["nacas"])
     elements.append(img)
     elements.append(Spacer(1, 0.5 * inch))
 
@@ -895,8 +2777,7 @@ def generate_pdf_report(nombre_interventions, temps_moyen_sur_site, age_moyen, m
     texte_nacas_par_personne = "Voici les 3 personnes qui se démarquent par leur nombre d'intervention avec des NACAs bas (0, 1, 9) : <br/>"
     i = 0
     for personne, (nb_nacas, nb_nacas_bas, pourcentage) in nacas_bas.items():
-        personne = personne.split(
-            " ")[0] + " " + personne.split(" ")[1][0] + "."
+        personne = abreger_nom(personne)
         texte_nacas_par_personne += f"{i+1}. <b>{pourcentage:.1%}</b> des interventions de <b>{personne}</b> ({nb_nacas_bas}/{nb_nacas})<br/>"
         if i >= 2:  # on affiche les 3 permiers
             break
@@ -904,8 +2785,7 @@ def generate_pdf_report(nombre_interventions, temps_moyen_sur_site, age_moyen, m
     texte_nacas_par_personne += "<br/>Et voici les 3 personnes qui se démarquent par leur nombre d'intervention avec des NACAs hauts (5, 6, 7) : <br/>"
     i = 0
     for personne, (nb_nacas, nb_nacas_haut, pourcentage) in nacas_hauts.items():
-        personne = personne.split(
-            " ")[0] + " " + personne.split(" ")[1][0] + "."
+        personne = abreger_nom(personne)
         texte_nacas_par_personne += f"{i+1}. <b>{pourcentage:.1%}</b> des interventions de <b>{personne}</b> ({nb_nacas_haut}/{nb_nacas})<br/>"
         if i >= 2:  # on affiche les 3 permiers
             break
@@ -923,48 +2803,45 @@ def generate_pdf_report(nombre_interventions, temps_moyen_sur_site, age_moyen, m
     elements.append(Spacer(1, 0.5 * inch))
 
     # Texte intro pour le graphique des âges
-    texte_temps_moyen = (
-        f"Nos patients avaient en moyenne "
-        f"<font color='#D62828'><b>{age_moyen:.1f}</b></font>"
-        f" ans. Ci-dessous, la répartition détaillée de leurs âges."
-    )
-    elements.append(Paragraph(texte_temps_moyen, style_texte['texte_grand']))
-    elements.append(Spacer(1, 0.5 * inch))
+    if age_moyen is not None:
+        texte_temps_moyen = (
+            f"Nos patients avaient en moyenne "
+            f"<font color='#D62828'><b>{age_moyen:.1f}</b></font>"
+            f" ans. Ci-dessous, la répartition détaillée de leurs âges."
+        )
+        elements.append(Paragraph(texte_temps_moyen, style_texte['texte_grand']))
+        elements.append(Spacer(1, 0.5 * inch))
 
     # Graphique des âges
-    img = Image(GRAPH_AGES_PATH, width=6 * inch, height=4 * inch)
+    img = element_graphique(graphiques["ages"])
     elements.append(img)
     elements.append(Spacer(1, 0.5 * inch))
 
     # Texte pour les âges moyens par ambulancier
-    ambu_senior, age_senior = max(
-        age_moyen_by_ambu.items(), key=lambda x: x[1])
-    ambu_senior = ambu_senior.split(
-        " ")[0] + " " + ambu_senior.split(" ")[1][0] + "."
-    ambu_junior, age_junior = min(
-        age_moyen_by_ambu.items(), key=lambda x: x[1])
-    ambu_junior = ambu_junior.split(
-        " ")[0] + " " + ambu_junior.split(" ")[1][0] + "."
-    texte_age_moyen_by_ambu = f"La médaille senior est attribuée à <b>{ambu_senior}</b>, ses patients avaient en moyenne <b>{age_senior:.1f}</b> ans."
-    texte_age_moyen_by_ambu += f"<br/>Alors qu'à l'inverse, les patients de <b>{ambu_junior}</b> avaient en moyenne <b>{age_junior:.1f}</b> ans."
-
-    elements.append(Paragraph(texte_age_moyen_by_ambu,
-                    style_texte['texte_normal']))
-    elements.append(Spacer(1, 0.5 * inch))
+    if age_moyen_by_ambu["seniors"]:
+        ambu_senior, age_senior = next(iter(age_moyen_by_ambu["seniors"].items()))
+        ambu_senior = abreger_nom(ambu_senior)
+        ambu_junior, age_junior = next(iter(age_moyen_by_ambu["juniors"].items()))
+        ambu_junior = abreger_nom(ambu_junior)
+        texte_age_moyen_by_ambu = f"La médaille senior est attribuée à <b>{ambu_senior}</b>, ses patients avaient en moyenne <b>{age_senior:.1f}</b> ans."
+        texte_age_moyen_by_ambu += f"<br/>Alors qu'à l'inverse, les patients de <b>{ambu_junior}</b> avaient en moyenne <b>{age_junior:.1f}</b> ans."
+
+        elements.append(Paragraph(texte_age_moyen_by_ambu,
+                        style_texte['texte_normal']))
+        elements.append(Spacer(1, 0.5 * inch))
 
     # Texte pour les interventions pédiatriques
     if len(nb_inter_ped) > 1:
         texte_inter_ped = "C'est <b>"
         texte_inter_ped += "</b>, <b>".join(
-            [personne.split(" ")[0] + " " + personne.split(" ")[1][0] + "." for personne in nb_inter_ped.keys()])
-        texte_inter_ped += f"</b> qui ont pris en charge le plus de petits-potes (-16 ans) ce mois-ci, avec <b>{list(nb_inter_ped.values())[0]}</b> interventions chacun.e !"
+            [abreger_nom(personne) for personne in nb_inter_ped.keys()])
+        texte_inter_ped += f"</b> qui ont pris en charge le plus de petits-potes (-16 ans) {ce}, avec <b>{list(nb_inter_ped.values())[0]}</b> interventions chacun.e !"
         elements.append(Paragraph(texte_inter_ped,
                         style_texte['texte_normal']))
-    else:
+    elif nb_inter_ped:
         personne_ped = list(nb_inter_ped.keys())[0]
-        personne_ped = personne_ped.split(
-            " ")[0] + " " + personne_ped.split(" ")[1][0] + "."
-        texte_inter_ped = f"Félicitations à <b>{personne_ped}</b> pour avoir effectué le plus d'interventions pédiatriques ce mois ci, avec <b>{list(nb_inter_ped.values())[0]}</b> interventions !"
+        personne_ped = abreger_nom(personne_ped)
+        texte_inter_ped = f"Félicitations à <b>{personne_ped}</b> pour avoir effectué le plus d'interventions pédiatriques {ce}, avec <b>{list(nb_inter_ped.values())[0]}</b> interventions !"
         elements.append(Paragraph(texte_inter_ped,
                         style_texte['texte_normal']))
 
@@ -979,7 +2856,7 @@ def generate_pdf_report(nombre_interventions, temps_moyen_sur_site, age_moyen, m
     elements.append(Spacer(1, 0.5 * inch))
 
     # Graphique des interventions par heure
-    img = Image(GRAPH_INTER_BY_HEURE_PATH, width=6 * inch, height=4 * inch)
+    img = element_graphique(graphiques["inter_by_heure"])
     elements.append(img)
     elements.append(Spacer(1, 0.5 * inch))
 
@@ -996,12 +2873,13 @@ def generate_pdf_report(nombre_interventions, temps_moyen_sur_site, age_moyen, m
     elements.append(Spacer(1, 0.5 * inch))
 
     # Les personnes avec le plus de départ à midi
-    ambu_midi, nb_depart_midi = max(
-        nb_depart_a_midi_by_personne.items(), key=lambda x: x[1])
-    texte_depart_midi = f"Petite pensée pour <b>{ambu_midi}</b> qui s'est fait interrompre le repas de midi le plus de fois, avec <b>{nb_depart_midi}</b> départs à midi ce mois-ci !"
-    elements.append(Paragraph(texte_depart_midi,
-                    style_texte['texte_normal']))
-    elements.append(Spacer(1, 0.5 * inch))
+    if nb_depart_a_midi_by_personne:
+        ambu_midi, nb_depart_midi = max(
+            nb_depart_a_midi_by_personne.items(), key=lambda x: x[1])
+        texte_depart_midi = f"Petite pensée pour <b>{ambu_midi}</b> qui s'est fait interrompre le repas de midi le plus de fois, avec <b>{nb_depart_midi}</b> départs à midi {ce} !"
+        elements.append(Paragraph(texte_depart_midi,
+                        style_texte['texte_normal']))
+        elements.append(Spacer(1, 0.5 * inch))
 
     # saut de page
     elements.append(PageBreak())
@@ -1014,140 +2892,618 @@ def generate_pdf_report(nombre_interventions, temps_moyen_sur_site, age_moyen, m
     elements.append(Spacer(1, 0.5 * inch))
 
     # Graphique des ambulances
-    img = Image(GRAPH_AMBULANCES_PATH, width=6 * inch, height=4 * inch)
+    img = element_graphique(graphiques["ambulances"])
     elements.append(img)
     elements.append(Spacer(1, 0.5 * inch))
 
+    # Occupation de la flotte : ambulances en intervention en même temps
+    if occupation is not None:
+        elements.append(PageBreak())
+        elements.append(Paragraph("Occupation des ambulances", style_texte['sous_titre']))
+        elements.append(Spacer(1, 0.5 * inch))
+        texte_occupation = f"Au plus fort, <b>{occupation['pic']}</b> ambulances étaient en intervention en même temps"
+        texte_occupation += f" (le {occupation['debut_pic']})." if occupation['debut_pic'] else "."
+        texte_occupation += (f" Les {occupation['nb_ambulances']} ambulances ont été toutes occupées pendant "
+                             f"<font color='#D62828'><b>{decimal_vers_hhmm(occupation['minutes_toutes_occupees'] / 60)}</b></font> {ce}.")
+        elements.append(Paragraph(texte_occupation, style_texte['texte_grand']))
+        elements.append(Spacer(1, 0.3 * inch))
+        img = element_graphique(graphiques["occupation"])
+        elements.append(img)
+        elements.append(Spacer(1, 0.3 * inch))
+        taux = ", ".join(f"{ambulance} : <b>{occupation['par_ambulance'][ambulance]['taux']:.0%}</b>"
+                         for ambulance in AMBULANCES)
+        elements.append(Paragraph(f"Part du temps passé en intervention par ambulance : {taux}.",
+                                  style_texte['texte_normal']))
+        elements.append(Spacer(1, 0.5 * inch))
+
     # PS pour expliquer que j'eneleve les personne qui ont fait moins de LIMITE_MIN_INTER interventions pour éviter les biais liés à un petit nombre d'interventions
-    texte_ps = f"PS: pour les statistiques par personne, je n'ai pris en compte que les personnes ayant effectué au moins <b>{LIMITE_MIN_INTER}</b> interventions ce mois-ci pour éviter les biais liés à un petit nombre d'interventions."
+    texte_ps = f"PS: pour les statistiques par personne, je n'ai pris en compte que les personnes ayant effectué au moins <b>{LIMITE_MIN_INTER}</b> interventions {ce} pour éviter les biais liés à un petit nombre d'interventions."
     elements.append(Paragraph(texte_ps, style_texte['texte_normal']))
 
     # Genérer le PDF
-    doc.build(elements, onFirstPage=pdf_header, onLaterPages=pdf_header)
-
-
-def main():
-    chemin_fichier = DATA_PATH
+    entete = partial(pdf_header, mois=mois, annee=annee, periode=periode,
+                     nb_pages=6 if occupation is None else 7, filtre=filtre)
+    doc.build(elements, onFirstPage=entete, onLaterPages=entete)
+
+
+# graphique du rapport -> fonction qui le dessine à partir du résultat du même nom
+GRAPHIQUES = {
+    "priorites": create_graph_priorites,
+    "ambulances": create_graph_ambulances,
+    "nacas": create_graph_nacas,
+    "ages": create_graph_ages,
+    "inter_by_heure": create_graph_heures,
+    "occupation": create_graph_occupation,
+}
+
+
+def dessiner_graphiques(resultats, graphiques, parallele=True, noms=None):
+    """Dessine les graphiques du rapport (tous, ou ceux de `noms`) et retourne quand ils sont écrits.
+
+    En parallèle, chaque graphique est dessiné dans un processus séparé
+    (chacun dans son propre fichier), une erreur de dessin est propagée.
+    """
+    a_dessiner = {nom: dessiner for nom, dessiner in GRAPHIQUES.items()
+                  if noms is None or nom in noms}
+    if not parallele or (os.cpu_count() or 1) < 2 or len(a_dessiner) < 2:
+        for nom, dessiner in a_dessiner.items():
+            dessiner(resultats[nom], graphiques[nom])
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count(), len(a_dessiner))) as executeur:
+        futures = [executeur.submit(dessiner, resultats[nom], graphiques[nom])
+                   for nom, dessiner in a_dessiner.items()]
+        for future in futures:
+            future.result()
+
+
+def calculer_fichier(chemin_fichier, incremental=False, flux=False):
+    # agrégateurs de tout l'export (voir generer_rapport pour les modes)
     print(f"Lecture du fichier CSV : {chemin_fichier}")
-
-    with open(chemin_fichier, newline="", encoding="utf-8") as csvfile:
-
-        print("Calcul du nombre d'interventions...")
-        lecteur = csv.reader(csvfile, delimiter=";")
-        nb_interventions_total = len(
-            list(lecteur)) - 1  # pour sauter l'en-tête
-
-        print("Génération des graphiques...")
-        # Génération du graphique des priorités
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        lecteur = csv.reader(csvfile, delimiter=";")
-        create_graph_priorites(repartition_priorites(lecteur))
-        print("Graphique des priorités généré.")
-
-        # Génération du graphique des ambulances
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        create_graph_ambulances(repartition_ambulances(lecteur))
-        print("Graphique des ambulances généré.")
-
-        # Génération du graphique des NACAs
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        create_graph_nacas(repartition_nacas(lecteur))
-        print("Graphique des NACA généré.")
-
-        # Génération du graphique des âges
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        ages = get_age_patients(lecteur)
-        create_graph_ages(ages)
-        print("Graphique des âges généré.")
-
-        # Génération du graphique des interventions par heure
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        inter_by_heure = get_nb_inter_by_heure(lecteur)
-        create_graph_heures(inter_by_heure)
-        print("Graphique des interventions par heure généré.")
-
-        # Calcul du temps sur site
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        temps_sur_site = get_temps_sur_site(lecteur)
-        print("Calcul du temps sur site terminé.")
-
-        # Calcul du nombre d'interventions par motif EST
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        motifs_EST = repartition_motif_est(lecteur)
-        print("Calcul de la répartition des motifs EST terminé.")
-
-        # Calcul du nombre de NACAs bas par personne
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        nacas_bas = get_nacas_bas(lecteur)
-        print("Calcul du nombre de NACAs bas par personne terminé.")
-
-        # Calcul du nombre de NACAs hauts par personne
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        nacas_hauts = get_nacas_hauts(lecteur)
-        print("Calcul du nombre de NACAs hauts par personne terminé.")
-
-        # Calcul du nombre des nacas pour la p3
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        nacas_p3 = get_naca_of_p3(lecteur)
-        print("Calcul du nombre de NACAs pour les P3 terminé.")
-
-        # Calcul du nombre d'interventions par personne au milieu de la nuit
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        inter_nuit = get_nb_inter_nuit_par_personne(lecteur)
-        print("Calcul du nombre d'interventions par personne au milieu de la nuit terminé.")
-
-        # Calcul du nombre d'interventions par personne
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        nb_inter_by_personne = get_most_interventions_by_personne(lecteur)
-        print("Calcul du nombre d'interventions par personne terminé.")
-
-        # Calcul du nombre d'interventions par binome
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        nb_inter_by_binome = get_most_interventions_by_binome(lecteur)
-        print("Calcul du nombre d'interventions par binome terminé.")
-
-        # Calcul du temps de prise en charge AVC le plus rapide
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        fastest_avc = get_fastest_avc(lecteur)
-        print("Calcul du temps de prise en charge AVC le plus rapide terminé.")
-
-        # Calcul de l'age moyen des patients par ambulancier
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        age_moyen_by_ambu = get_patient_age_moyen_by_ambulancier(lecteur)
-        print("Calcul des âges moyens des patients par ambulancier terminé.")
-
-        # Calcul de la personne avec le plus d'interventions pédiatriques
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        nb_inter_ped = get_nbmax_inter_ped(lecteur)
-        print("Calcul de la personne avec le plus d'interventions pédiatriques terminé.")
-
-        # Calcul du nombre de départ à midi par personne
-        csvfile.seek(0)  # revenir au début du fichier pour relire les données
-        lecteur = csv.reader(csvfile, delimiter=";")
-        nb_depart_a_midi_by_personne = get_max_depart_a_midi(lecteur)
-        print("Calcul du nombre de départ à midi par personne terminé.")
-
+    agregateurs = creer_agregateurs()
+    if incremental:
+        # seules les lignes ajoutées depuis la dernière exécution sont lues
+        with Etape("lecture et calcul incrémentaux") as etape:
+            agregateurs, heures_invalides, nb_lignes = calculer_incremental(
+                chemin_fichier)
+            etape.lignes = nb_lignes
+        print(f"{nb_lignes} nouvelle(s) ligne(s) lue(s).")
+    elif flux:
+        # lecture par blocs (un morceau par cœur pour un gros export), sans
+        # garder l'export entier en mémoire ni en cache
+        heures_invalides = {}
+        with Etape("lecture et calcul par blocs") as etape:
+            calculer_parallele(chemin_fichier, agregateurs, heures_invalides)
+            etape.lignes = agregateurs["nb_interventions"].resultat()
+    else:
+        # une seule lecture du fichier pour toutes les statistiques (aucune si elle est en cache)
+        with Etape("lecture") as etape:
+            table = charger_table_fichier(chemin_fichier)
+            etape.lignes = len(table)
+        heures_invalides = table.heures_invalides
+        with Etape("calcul", lignes=len(table)):
+            calculer_table(table, agregateurs)
+    for colonne, nombre in heures_invalides.items():
+        if nombre:
+            print(f"ATTENTION : {nombre} heure(s) illisible(s) dans la colonne {colonne}, ignorée(s).")
+    return agregateurs, heures_invalides
+
+
+def generer_rapport(chemin_fichier, output_path, dossier_graphiques, mois, annee, graphiques_en_parallele=True, incremental=False, flux=False, vectoriel=False):
+    os.makedirs(dossier_graphiques, exist_ok=True)
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    graphiques = chemins_graphiques(dossier_graphiques)
+    agregateurs, _ = calculer_fichier(chemin_fichier, incremental, flux)
+
+    # résumé du mois, réutilisé par les rapports annuels
+    if mois in NOMS_MOIS:
+        with Etape("résumé mensuel"):
+            enregistrer_resume(agregateurs, mois, annee)
+    rapport_depuis_resume(agregateurs, output_path, graphiques,
+                          mois, annee, graphiques_en_parallele, vectoriel=vectoriel)
+
+
+def resultats_agregateurs(agregateurs):
+    # résultat de chaque agrégateur, plus les classements par personne et par binôme qui en sont tirés
+    resultats = {nom: agregateur.resultat() for nom, agregateur in agregateurs.items()}
+    resultats.update(classements_par_personne(resultats["par_personne"]))
+    resultats.update(classements_binomes(resultats["binomes"]))
+    return resultats
+
+
+def rapport_depuis_resume(agregateurs, output_path, graphiques, mois, annee, graphiques_en_parallele=True, periode="mois", vectoriel=False, filtre=""):
+    # graphiques et PDF à partir des agrégateurs d'un mois ou de plusieurs mois fusionnés
+    with Etape("résultats"):
+        resultats = resultats_agregateurs(agregateurs)
+    print(f"Calcul des statistiques terminé ({resultats['nb_interventions']} interventions).")
+
+    print("Génération des graphiques...")
+    with Etape("graphiques"):
+        if vectoriel:
+            # les graphiques en barres sont dessinés par reportlab, seuls les autres passent par matplotlib
+            graphiques = dict(graphiques)
+            for nom, dessiner in DESSINS_VECTORIELS.items():
+                graphiques[nom] = dessiner(resultats[nom])
+            dessiner_graphiques(resultats, graphiques, graphiques_en_parallele,
+                                [nom for nom in GRAPHIQUES if nom not in DESSINS_VECTORIELS])
+        else:
+            dessiner_graphiques(resultats, graphiques, graphiques_en_parallele)
+    print("Graphiques générés.")
+
+    with Etape("PDF", lignes=resultats["nb_interventions"]):
         generate_pdf_report(
-            nb_interventions_total, temps_sur_site['moyenne'], age_moyen=np.mean(ages), motifs_EST=motifs_EST, nacas_bas=nacas_bas, nacas_hauts=nacas_hauts, nacas_p3=nacas_p3, inter_nuit=inter_nuit, nb_inter_by_personne=nb_inter_by_personne, nb_inter_by_binome=nb_inter_by_binome, fastest_avc=fastest_avc, age_moyen_by_ambu=age_moyen_by_ambu, nb_inter_ped=nb_inter_ped, nb_depart_a_midi_by_personne=nb_depart_a_midi_by_personne)
-        print(f"Rapport PDF généré : {OUTPUT_PATH}")
-
-        print("ATTENTION AU DOUBLE ESPACE DANS LE FICHIER CSV")
+            resultats["nb_interventions"], resultats["temps_sur_site"]['moyenne'], age_moyen=resume_ages(resultats["ages"])["moyenne"] if resultats["ages"] else None, motifs_EST=resultats["motifs_EST"], nacas_bas=resultats["nacas_bas"], nacas_hauts=resultats["nacas_hauts"], nacas_p3=resultats["nacas_p3"], inter_nuit=resultats["inter_nuit"], nb_inter_by_personne=resultats["nb_inter_by_personne"], nb_inter_by_binome=resultats["nb_inter_by_binome"], fastest_avc=resultats["fastest_avc"], age_moyen_by_ambu=resultats["age_moyen_by_ambu"], nb_inter_ped=resultats["nb_inter_ped"], nb_depart_a_midi_by_personne=resultats["nb_depart_a_midi_by_personne"], output_path=output_path, graphiques=graphiques, mois=mois, annee=annee, periode=periode, quantiles_durees=resultats["quantiles_durees"], occupation=resultats["occupation"], filtre=filtre)
+    print(f"Rapport PDF généré : {output_path}")
+
+
+def resultats_complets(agregateurs):
+    # resultats_agregateurs, plus les chiffres dérivés affichés dans le PDF
+    resultats = resultats_agregateurs(agregateurs)
+    resultats["resume_ages"] = resume_ages(resultats["ages"]) if resultats["ages"] else None
+    return resultats
+
+
+def valeurs_json(valeur):
+    # tuples -> listes, clés -> textes, infini (aucune intervention) -> null
+    if isinstance(valeur, dict):
+        return {str(cle): valeurs_json(v) for cle, v in valeur.items()}
+    if isinstance(valeur, (list, tuple)):
+        return [valeurs_json(v) for v in valeur]
+    if isinstance(valeur, float) and not np.isfinite(valeur):
+        return None
+    return valeur
+
+
+def generer_json(chemin_fichier, chemin_json, mois, annee, incremental=False, flux=False):
+    """Écrit en JSON tous les chiffres du rapport, sans graphiques ni PDF.
+
+    Pour les tableaux de bord et les vérifications automatiques : ni
+    matplotlib ni reportlab ne sont importés.
+    """
+    agregateurs, heures_invalides = calculer_fichier(chemin_fichier, incremental, flux)
+    with Etape("résultats"):
+        resultats = resultats_complets(agregateurs)
+
+    os.makedirs(os.path.dirname(chemin_json) or ".", exist_ok=True)
+    with open(chemin_json, "w", encoding="utf-8") as fichier:
+        json.dump(valeurs_json({"fichier": chemin_fichier, "mois": mois, "annee": annee,
+                                "heures_invalides": heures_invalides, "statistiques": resultats}),
+                  fichier, ensure_ascii=False, indent=2)
+    print(f"Statistiques écrites : {chemin_json}")
+
+
+def generer_rapport_annuel(annee, dernier_mois=None, vectoriel=False):
+    """Rapport de l'année (ou depuis le début de l'année) à partir des résumés mensuels.
+
+    Les mois de janvier à `dernier_mois` (toute l'année par défaut) dont le
+    résumé existe sont fusionnés ; aucun export n'est relu.
+    """
+    fin = NOMS_MOIS.index(dernier_mois) + 1 if dernier_mois else len(NOMS_MOIS)
+    resumes = {}
+    for mois in NOMS_MOIS[:fin]:
+        agregateurs = lire_resume(mois, annee)
+        if agregateurs is not None:
+            resumes[mois] = agregateurs
+    if not resumes:
+        print(f"Aucun résumé mensuel pour {annee} dans {RESUMES_DIR}")
+        return
+    print(f"Mois fusionnés : {', '.join(resumes)}")
+    with Etape("fusion des résumés"):
+        fusion = fusionner_resumes(resumes.values())
+
+    mois_couverts = list(resumes)
+    if len(mois_couverts) == len(NOMS_MOIS):
+        periode_mois, nom = "", annee
+    else:
+        periode_mois = mois_couverts[0] if len(mois_couverts) == 1 else f"{mois_couverts[0]} à {mois_couverts[-1]}"
+        nom = f"{periode_mois} {annee}"
+    dossier_graphiques = f"{OUTPUT_DIR}/{nom}"
+    output_path = f"{OUTPUT_DIR}/rapport_qualite - {nom}.pdf"
+    os.makedirs(dossier_graphiques, exist_ok=True)
+    rapport_depuis_resume(fusion, output_path,
+                          chemins_graphiques(dossier_graphiques), periode_mois, annee, periode="annee",
+                          vectoriel=vectoriel)
+
+
+# ====== SOUS-RAPPORTS =====
+# Le rapport d'une partie seulement des interventions d'un export (une
+# ambulance, une priorité, la nuit, une commune...) : un masque booléen est
+# construit sur la table déjà chargée (voir charger_table_fichier) et tous
+# les agrégateurs et graphiques sont calculés sur les lignes du masque.
+
+# colonne filtrable -> nom affiché dans le titre des sous-rapports
+NOMS_FILTRES = {"priorite": "priorité", "ambulance": "ambulance", "naca": "NACA",
+                "motif_est": "motif EST", "degre_est": "degré EST", "jour_nuit": "",
+                "commune": "commune", "leader": "leader", "equipier": "équipier",
+                "troisieme": "troisième"}
+
+
+def categorie_filtre(table, colonne):
+    # catégorie des libellés d'une colonne filtrable, ValueError si la colonne n'est pas catégorielle
+    categorie = "personne" if colonne in COLONNES_PERSONNES.values() else colonne
+    if colonne not in table.colonnes or categorie not in table.categories:
+        raise ValueError(f"Colonne de filtre inconnue : {colonne}")
+    return categorie
+
+
+def masque_filtres(table, filtres):
+    """Masque des lignes de la table qui vérifient tous les filtres.
+
+    `filtres` est un dict colonne -> libellé (ou liste de libellés acceptés)
+    sur les colonnes catégorielles de la table, par exemple
+    {"ambulance": "704", "jour_nuit": "Nuit"} ; leader, équipier et troisième
+    se filtrent par nom.
+    """
+    masque = np.ones(len(table), dtype=bool)
+    for colonne, libelles in filtres.items():
+        categorie = categorie_filtre(table, colonne)
+        libelles = {libelles} if isinstance(libelles, str) else set(libelles)
+        masque &= np.isin(table[colonne], table.codes(categorie, lambda libelle: libelle in libelles))
+    return masque
+
+
+def masque_ou_quitter(table, filtres, colonnes=()):
+    # masque_filtres pour la ligne de commande (--filtre, --par) : une colonne
+    # inconnue, dans les filtres ou dans `colonnes`, arrête le script sur une
+    # ligne d'erreur plutôt que sur une trace
+    try:
+        for colonne in colonnes:
+            categorie_filtre(table, colonne)
+        return masque_filtres(table, filtres)
+    except ValueError as erreur:
+        sys.exit(f"{erreur} (colonnes filtrables : {', '.join(NOMS_FILTRES)})")
+
+
+def texte_filtres(filtres):
+    # {"ambulance": "704", "jour_nuit": "Nuit"} -> "ambulance 704, Nuit"
+    textes = []
+    for colonne, libelles in filtres.items():
+        libelles = [libelles] if isinstance(libelles, str) else list(libelles)
+        textes.append(" ".join(filter(None, [NOMS_FILTRES.get(colonne, colonne), " ou ".join(libelles)])))
+    return ", ".join(textes)
+
+
+def chemins_sous_rapport(chemin_fichier, filtres):
+    # (PDF, dossier des graphiques) du sous-rapport d'un export
+    nom = f"{os.path.splitext(os.path.basename(chemin_fichier))[0]} - {texte_filtres(filtres)}".replace("/", "-")
+    return f"{OUTPUT_DIR}/rapport_qualite - {nom}.pdf", f"{OUTPUT_DIR}/{nom}"
+
+
+def calculer_filtre(table, masque):
+    # agrégateurs calculés sur les seules lignes du masque (voir masque_filtres)
+    agregateurs = creer_agregateurs()
+    with Etape("filtre", lignes=len(table)):
+        sous_table = table.filtrer(masque)
+    calculer_table(sous_table, agregateurs)
+    return agregateurs
+
+
+def generer_rapport_filtre(chemin_fichier, filtres, graphiques_en_parallele=True, vectoriel=False):
+    # rapport des interventions de l'export qui vérifient les filtres ; la
+    # table vient du cache, l'export n'est reparsé que s'il a changé
+    mois, annee = mois_annee_depuis_nom(chemin_fichier) or ("", "")
+    with Etape("lecture") as etape:
+        table = charger_table_fichier(chemin_fichier)
+        etape.lignes = len(table)
+    # filtres validés avant de créer le dossier du sous-rapport
+    masque = masque_ou_quitter(table, filtres)
+    if not masque.any():
+        print(f"Aucune intervention ({texte_filtres(filtres)}) dans {chemin_fichier} : pas de rapport")
+        return
+    agregateurs = calculer_filtre(table, masque)
+    output_path, dossier_graphiques = chemins_sous_rapport(chemin_fichier, filtres)
+    os.makedirs(dossier_graphiques, exist_ok=True)
+    rapport_depuis_resume(agregateurs, output_path, chemins_graphiques(dossier_graphiques), mois, annee,
+                          graphiques_en_parallele, vectoriel=vectoriel, filtre=texte_filtres(filtres))
+
+
+def generer_sous_rapports(chemin_fichier, colonne, filtres=None, vectoriel=False):
+    """Un sous-rapport par libellé de `colonne`, générés en parallèle.
+
+    Les `filtres` communs (voir masque_filtres) sont appliqués d'abord ;
+    seuls les libellés présents dans les lignes restantes ont un rapport.
+    L'export est lu (ou pris dans le cache) une fois ici, chaque processus
+    relit ensuite la table depuis le cache.
+    """
+    filtres = filtres or {}
+    table = charger_table_fichier(chemin_fichier)
+    masque = masque_ou_quitter(table, filtres, [colonne])
+    categorie = categorie_filtre(table, colonne)
+    codes = np.unique(table[colonne][masque & (table[colonne] >= 0)])
+    libelles = [table.categories[categorie][code] for code in codes.tolist()]
+    if not libelles:
+        print(f"Aucune intervention à répartir par {colonne} dans {chemin_fichier}")
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, len(libelles))) as executeur:
+        futures = {executeur.submit(generer_rapport_filtre, chemin_fichier, {**filtres, colonne: libelle},
+                                    graphiques_en_parallele=False, vectoriel=vectoriel): libelle
+                   for libelle in libelles}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as erreur:
+                print(f"ERREUR lors du sous-rapport {colonne} {futures[future]} : {erreur!r}")
+
+
+def filtres_arguments(arguments):
+    # ["--filtre", "ambulance=704", "--filtre", "ambulance=705"] -> {"ambulance": ["704", "705"]}
+    filtres = {}
+    for option, valeur in zip(arguments, arguments[1:]):
+        if option == "--filtre":
+            colonne, _, libelle = valeur.partition("=")
+            filtres.setdefault(colonne, []).append(libelle)
+    return filtres
+
+
+# ====== SERVICE LOCAL =====
+# python stats.py --service : petit serveur HTTP local qui répond aux
+# questions ponctuelles en JSON (n'importe quelle statistique) ou en PNG
+# (n'importe quel graphique), sans générer de rapport. Les exports lus
+# récemment restent en mémoire (voir CacheMois) : une nouvelle question sur
+# un mois déjà lu ne relit pas le CSV.
+#   GET /mois                                        exports de DATA_DIR
+#   GET /stats/novembre 2025                         toutes les statistiques du mois
+#   GET /stats/novembre 2025/nb_inter_by_personne?priorite=P1
+#                                                    une statistique, sur les lignes filtrées (voir masque_filtres)
+#   GET /stats/novembre 2025/get_longest_inter       idem, sous le nom de sa fonction (voir CLES_FONCTIONS)
+#   GET /graphiques/novembre 2025/priorites.png      un graphique (mêmes filtres possibles)
+HOTE_SERVICE = "127.0.0.1"
+PORT_SERVICE = 8765
+MEMOIRE_MAX_SERVICE = 512 * 1024 * 1024  # en octets : tables, résultats et PNG des mois gardés en mémoire
+DOSSIER_SERVICE = f"{OUTPUT_DIR}/service"
+
+
+class CacheMois:
+    """Exports lus récemment, gardés en mémoire avec leurs résultats (LRU).
+
+    Chaque mois garde sa table, les résultats déjà calculés (un jeu par
+    filtre) et les PNG déjà dessinés. Quand la mémoire estimée dépasse
+    `memoire_max`, les mois utilisés le moins récemment sont oubliés, puis,
+    dans le dernier mois utilisé, les résultats et les PNG les moins
+    récemment utilisés (sa table est toujours gardée). Un export modifié sur
+    le disque est relu à la question suivante.
+    """
+
+    def __init__(self, memoire_max=MEMOIRE_MAX_SERVICE):
+        import threading
+        self.memoire_max = memoire_max
+        # chemin -> {"signature", "table", "resultats", "graphiques"}, du moins au plus récemment utilisé ;
+        # "resultats" (clé -> (résultats, octets)) et "graphiques" (clé -> PNG) sont aussi dans cet ordre
+        self.mois = OrderedDict()
+        self.verrou = threading.Lock()
+        # chemin -> verrou de sa lecture : deux requêtes sur un même mois à lire n'en font qu'une
+        self.verrous_lecture = defaultdict(threading.Lock)
+        # les graphiques passent par un même fichier et par le cache des graphiques : un seul dessin à la fois
+        self.verrou_dessin = threading.Lock()
+
+    def entree_a_jour(self, chemin_fichier, signature):
+        # appelé avec le verrou : l'entrée du mois si elle correspond à l'export sur le disque
+        entree = self.mois.get(chemin_fichier)
+        if entree is None or entree["signature"] != signature:
+            return None
+        self.mois.move_to_end(chemin_fichier)
+        return entree
+
+    def entree(self, chemin_fichier):
+        infos = os.stat(chemin_fichier)
+        signature = (infos.st_size, infos.st_mtime_ns)
+        with self.verrou:
+            entree = self.entree_a_jour(chemin_fichier, signature)
+            if entree is not None:
+                return entree
+            verrou_lecture = self.verrous_lecture[chemin_fichier]
+        # lecture hors du verrou : les mois déjà en mémoire restent disponibles
+        # pendant ce temps ; les autres requêtes sur ce mois attendent la lecture
+        with verrou_lecture:
+            with self.verrou:
+                entree = self.entree_a_jour(chemin_fichier, signature)
+                if entree is not None:
+                    return entree
+            with Etape("lecture") as etape:
+                table = charger_table_fichier(chemin_fichier)
+                etape.lignes = len(table)
+            entree = {"signature": signature, "table": table, "resultats": OrderedDict(), "graphiques": OrderedDict()}
+            with self.verrou:
+                self.mois[chemin_fichier] = entree
+                self.liberer()
+        return entree
+
+    def resultats(self, chemin_fichier, filtres):
+        # résultats (voir resultats_complets) des lignes du mois qui vérifient les filtres
+        entree = self.entree(chemin_fichier)
+        cle = json.dumps(filtres, sort_keys=True)
+        with self.verrou:
+            if cle in entree["resultats"]:
+                entree["resultats"].move_to_end(cle)
+                return entree["resultats"][cle][0]
+        # calcul hors du verrou, comme la lecture dans entree
+        resultats = resultats_complets(calculer_filtre(entree["table"], masque_filtres(entree["table"], filtres)))
+        # taille estimée par celle des résultats sérialisés (tableaux de l'occupation compris)
+        octets = len(pickle.dumps(resultats, protocol=pickle.HIGHEST_PROTOCOL))
+        with self.verrou:
+            entree["resultats"][cle] = (resultats, octets)
+            self.liberer()
+        return resultats
+
+    def graphique(self, chemin_fichier, filtres, nom):
+        # PNG du graphique `nom` (voir GRAPHIQUES) des lignes du mois qui vérifient les filtres
+        resultats = self.resultats(chemin_fichier, filtres)
+        entree = self.entree(chemin_fichier)
+        cle = (json.dumps(filtres, sort_keys=True), nom)
+        with self.verrou:
+            if cle in entree["graphiques"]:
+                entree["graphiques"].move_to_end(cle)
+                return entree["graphiques"][cle]
+        with self.verrou_dessin:
+            os.makedirs(DOSSIER_SERVICE, exist_ok=True)
+            chemin_png = f"{DOSSIER_SERVICE}/{nom}.png"
+            GRAPHIQUES[nom](resultats[nom], chemin_png)
+            with open(chemin_png, "rb") as fichier:
+                png = fichier.read()
+        with self.verrou:
+            entree["graphiques"][cle] = png
+            self.liberer()
+        return png
+
+    def memoire(self):
+        # octets estimés : colonnes des tables (et instants des phases), résultats et PNG
+        total = 0
+        for entree in self.mois.values():
+            table = entree["table"]
+            total += sum(valeurs.nbytes for valeurs in table.colonnes.values())
+            total += sum(instants.nbytes for instants in (table._horodatages or {}).values())
+            total += sum(octets for _, octets in entree["resultats"].values())
+            total += sum(len(png) for png in entree["graphiques"].values())
+        return total
+
+    def liberer(self):
+        # appelé avec le verrou : oublie les mois les moins récemment utilisés,
+        # puis les résultats et les PNG les plus anciens du dernier mois
+        while self.mois and self.memoire() > self.memoire_max:
+            if len(self.mois) > 1:
+                self.mois.popitem(last=False)
+                continue
+            entree = next(iter(self.mois.values()))
+            if entree["resultats"]:
+                entree["resultats"].popitem(last=False)
+            elif entree["graphiques"]:
+                entree["graphiques"].popitem(last=False)
+            else:
+                break
+
+
+def exports_disponibles(dossier_donnees=DATA_DIR):
+    # nom (sans .csv), mois et année de chaque export du dossier
+    exports = []
+    for nom_fichier in sorted(os.listdir(dossier_donnees)):
+        if nom_fichier.lower().endswith(".csv"):
+            mois, annee = mois_annee_depuis_nom(nom_fichier) or (None, None)
+            exports.append({"nom": os.path.splitext(nom_fichier)[0], "mois": mois, "annee": annee})
+    return exports
+
+
+def classe_service():
+    # classe des requêtes du service, créée à la demande : le serveur HTTP
+    # (http.server tire email, http.client et ssl) n'est importé que par --service
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import parse_qs, unquote, urlsplit
+
+    class ServiceRapports(BaseHTTPRequestHandler):
+        """Répond aux requêtes GET du service (voir les adresses ci-dessus).
+
+        Le serveur (voir servir) porte le CacheMois partagé par toutes les
+        requêtes et le dossier des exports.
+        """
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            parties = [unquote(partie) for partie in url.path.strip("/").split("/")]
+            # ?ambulance=704&priorite=P1&priorite=P2 -> {"ambulance": ["704"], "priorite": ["P1", "P2"]}
+            filtres = parse_qs(url.query)
+            if parties == ["mois"]:
+                self.envoyer_json(exports_disponibles(self.server.dossier_donnees))
+                return
+            if len(parties) < 2 or parties[0] not in ("stats", "graphiques") or len(parties) > 3:
+                self.envoyer_erreur(404, f"Adresse inconnue : {url.path}")
+                return
+            chemin_fichier = f"{self.server.dossier_donnees}/{parties[1]}.csv"
+            if os.path.basename(parties[1]) != parties[1] or not os.path.isfile(chemin_fichier):
+                self.envoyer_erreur(404, f"Export introuvable : {parties[1]}")
+                return
+
+            try:
+                if parties[0] == "stats":
+                    resultats = self.server.cache.resultats(chemin_fichier, filtres)
+                    nom = CLES_FONCTIONS.get(parties[2], parties[2]) if len(parties) == 3 else ""
+                    if len(parties) == 2:
+                        self.envoyer_json(resultats)
+                    elif nom in resultats:
+                        self.envoyer_json(resultats[nom])
+                    else:
+                        self.envoyer_erreur(404, f"Statistique inconnue : {parties[2]}")
+                else:
+                    nom = parties[2].removesuffix(".png") if len(parties) == 3 else ""
+                    if nom not in GRAPHIQUES:
+                        self.envoyer_erreur(404, f"Graphique inconnu : {nom}")
+                        return
+                    self.envoyer(200, "image/png", self.server.cache.graphique(chemin_fichier, filtres, nom))
+            except ValueError as erreur:
+                # colonne de filtre inconnue
+                self.envoyer_erreur(400, str(erreur))
+
+        def envoyer(self, code, type_contenu, contenu):
+            self.send_response(code)
+            self.send_header("Content-Type", type_contenu)
+            self.send_header("Content-Length", str(len(contenu)))
+            self.end_headers()
+            self.wfile.write(contenu)
+
+        def envoyer_json(self, valeur, code=200):
+            self.envoyer(code, "application/json; charset=utf-8",
+                         json.dumps(valeurs_json(valeur), ensure_ascii=False, indent=2).encode("utf-8"))
+
+        def envoyer_erreur(self, code, message):
+            self.envoyer_json({"erreur": message}, code)
+
+    return ServiceRapports
+
+
+def creer_serveur(hote=HOTE_SERVICE, port=PORT_SERVICE, dossier_donnees=DATA_DIR, memoire_max=MEMOIRE_MAX_SERVICE):
+    # serveur du service, pas encore lancé (port 0 : un port libre au choix du système)
+    from http.server import ThreadingHTTPServer
+    serveur = ThreadingHTTPServer((hote, port), classe_service())
+    serveur.cache = CacheMois(memoire_max)
+    serveur.dossier_donnees = dossier_donnees
+    return serveur
+
+
+def servir(hote=HOTE_SERVICE, port=PORT_SERVICE, dossier_donnees=DATA_DIR, memoire_max=MEMOIRE_MAX_SERVICE):
+    serveur = creer_serveur(hote, port, dossier_donnees, memoire_max)
+    print(f"Service des statistiques : http://{hote}:{serveur.server_port}/mois (Ctrl+C pour arrêter)")
+    try:
+        serveur.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        serveur.server_close()
+
+
+def main(incremental=False, flux=False, vectoriel=False):
+    generer_rapport(DATA_PATH, OUTPUT_PATH, OUTPUT_DIR, MOIS, ANNEE,
+                    incremental=incremental, flux=flux, vectoriel=vectoriel)
+
+
+def main_tous_les_mois(dossier_donnees=DATA_DIR):
+    # un rapport par export du dossier, générés en parallèle ; chaque mois a
+    # son propre dossier de graphiques pour que les processus ne s'écrasent pas,
+    # et les graphiques d'un mois sont dessinés dans le processus de ce mois
+    taches = []
+    for nom_fichier in sorted(os.listdir(dossier_donnees)):
+        if not nom_fichier.lower().endswith(".csv"):
+            continue
+        mois_annee = mois_annee_depuis_nom(nom_fichier)
+        if mois_annee is None:
+            print(f"Fichier ignoré (mois et année introuvables dans le nom) : {nom_fichier}")
+            continue
+        nom = os.path.splitext(nom_fichier)[0]
+        taches.append((f"{dossier_donnees}/{nom_fichier}", f"{OUTPUT_DIR}/rapport_qualite - {nom}.pdf",
+                       f"{OUTPUT_DIR}/{nom}", *mois_annee))
+    if not taches:
+        print(f"Aucun export trouvé dans {dossier_donnees}")
+        return
+
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    with ProcessPoolExecutor(max_workers=min(os.cpu_count() or 1, len(taches))) as executeur:
+        futures = {executeur.submit(generer_rapport, *tache, graphiques_en_parallele=False): tache[0]
+                   for tache in taches}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as erreur:
+                print(f"ERREUR lors du rapport de {futures[future]} : {erreur!r}")
 
 
 def tests():
@@ -1161,9 +3517,50 @@ def tests():
 
 # ====== EXECUTION =====
 
-
-main()
-# tests()
+if __name__ == "__main__":
+    # python stats.py --tous : un rapport pour chaque export de DATA_DIR
+    # python stats.py --incremental : ne lit que les lignes ajoutées depuis la dernière exécution
+    # python stats.py --flux : lit l'export par blocs, mémoire constante quelle que soit sa taille
+    #                         (un gros export est lu en parallèle sur tous les cœurs)
+    # python stats.py --annee 2025 : rapport de l'année à partir des résumés mensuels déjà calculés
+    # python stats.py --vectoriel : graphiques en barres dessinés en vectoriel dans le PDF (sans PNG)
+    # python stats.py --base : charge chaque export de DATA_DIR dans la base SQLite BASE_PATH
+    # python stats.py --filtre ambulance=704 --filtre jour_nuit=Nuit : rapport des seules interventions
+    #                         qui vérifient les filtres (plusieurs --filtre sur une colonne : l'une ou l'autre valeur)
+    # python stats.py --par commune : un sous-rapport par commune (avec --filtre : parmi les lignes filtrées)
+    # python stats.py --service : serveur HTTP local des statistiques et graphiques (voir SERVICE LOCAL)
+    # python stats.py --json : uniquement les chiffres, dans JSON_PATH (sans graphiques ni PDF)
+    # python stats.py --trace : durée, CPU, lignes et mémoire de chaque étape dans TRACE_PATH,
+    #                           avec --trace-tableau elles sont aussi affichées
+    if "--trace" in sys.argv[1:] or "--trace-tableau" in sys.argv[1:]:
+        activer_trace()
+    if "--tous" in sys.argv[1:]:
+        main_tous_les_mois()
+    elif "--service" in sys.argv[1:]:
+        servir()
+    elif "--base" in sys.argv[1:]:
+        main_base()
+    elif "--par" in sys.argv[1:-1]:
+        generer_sous_rapports(DATA_PATH, sys.argv[sys.argv.index("--par") + 1],
+                              filtres_arguments(sys.argv[1:]), vectoriel="--vectoriel" in sys.argv[1:])
+    elif "--filtre" in sys.argv[1:-1]:
+        generer_rapport_filtre(DATA_PATH, filtres_arguments(sys.argv[1:]),
+                               vectoriel="--vectoriel" in sys.argv[1:])
+    elif "--annee" in sys.argv[1:-1]:
+        generer_rapport_annuel(sys.argv[sys.argv.index("--annee") + 1],
+                               vectoriel="--vectoriel" in sys.argv[1:])
+    elif "--json" in sys.argv[1:]:
+        generer_json(DATA_PATH, JSON_PATH, MOIS, ANNEE, incremental="--incremental" in sys.argv[1:],
+                     flux="--flux" in sys.argv[1:])
+    else:
+        main(incremental="--incremental" in sys.argv[1:],
+             flux="--flux" in sys.argv[1:],
+             vectoriel="--vectoriel" in sys.argv[1:])
+    if trace is not None:
+        ecrire_trace()
+        if "--trace-tableau" in sys.argv[1:]:
+            afficher_trace()
+    # tests()
 
 # === TODO ===
 
@@ -1180,6 +3577,7 @@ main()
 # DONE : qui a fait le plus d'interventions
 # DONE : le binome avec le plus d'interventions
 # DONE : prise en charge avc la plus rapide
+# DONE : rapport annuel / depuis le début de l'année (python stats.py --annee 2025)
 #
 #
 #